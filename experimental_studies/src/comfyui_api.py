@@ -5,16 +5,133 @@ import os
 import sys
 import time
 import base64
+import io
 import uuid
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import urllib3
 import websocket
+from requests.adapters import HTTPAdapter
 from PyQt5.QtGui import QImage
+from workflow_compiler import WorkflowCompiler
+from upload_cache import ImageEncoder, UploadIndex, content_name, reserve_output_path
+
+WORKFLOW_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vanGogh_style_transferring_workflow.json")
+
+# Uç nokta başına (bağlantı, okuma) zaman aşımları, saniye
+DEFAULT_TIMEOUTS = {
+    "check": (2, 5),
+    "upload": (5, 120),
+    "prompt": (5, 30),
+    "history": (5, 30),
+    "view": (5, 120),
+    "object_info": (5, 60),
+}
+# Yeniden denemeye değer sunucu yanıtları
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+
+class HTTPTransport:
+    """Keep-alive bağlantı havuzu kullanan HTTP taşıma katmanı.
+
+    Tek bir requests.Session üzerinden çalışır; her uç noktanın kendi zaman aşımı vardır.
+    Idempotent çağrılar (GET) bağlantı hatası, zaman aşımı veya geçici sunucu hatasında
+    üstel geri çekilme (exponential backoff) ile yeniden denenir. POST isteği ise yalnızca
+    bağlantı kurulamadığında, yani istek sunucuya hiç ulaşmadığında yeniden denenir.
+    """
+
+    def __init__(self, server_url, pool_size=16, retries=3, backoff_factor=0.5, max_backoff=8.0, timeouts=None):
+        self.base_url = f"http://{server_url}"
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0, pool_block=False)
+        self.session.mount("http://", self.adapter)
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def get(self, endpoint, path, retry=True, **kwargs):
+        return self.request("GET", endpoint, path, retry=retry, **kwargs)
+
+    def post(self, endpoint, path, retry=True, **kwargs):
+        return self.request("POST", endpoint, path, retry=retry, **kwargs)
+
+    def request(self, method, endpoint, path, retry=True, **kwargs):
+        """İsteği gönderir; endpoint adı zaman aşımını ve metrik anahtarını belirler."""
+        kwargs.setdefault("timeout", self.timeouts.get(endpoint, (5, 60)))
+        idempotent = method in ("GET", "HEAD", "OPTIONS")
+        attempts = 1 + (self.retries if retry else 0)
+        for attempt in range(attempts):
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record(endpoint, time.perf_counter() - start, error=True)
+                if attempt + 1 >= attempts or not (idempotent or self._is_connect_failure(e)):
+                    raise
+            else:
+                self._record(endpoint, time.perf_counter() - start, int(response.headers.get("Content-Length", 0)))
+                if not (idempotent and response.status_code in RETRY_STATUS_CODES and attempt + 1 < attempts):
+                    return response
+                response.close()  # Bağlantı havuza geri dönsün (stream=True isteklerde gövde okunmadı)
+            # Dosya gövdeleri yeniden okunabilsin diye başa sarılır
+            for _, value in (kwargs.get("files") or {}).items():
+                if isinstance(value, tuple) and hasattr(value[1], "seek"):
+                    value[1].seek(0)
+            self._record_retry(endpoint)
+            time.sleep(min(self.max_backoff, self.backoff_factor * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+    @staticmethod
+    def _is_connect_failure(error):
+        # Bağlantı kurulamadıysa istek sunucuya ulaşmamıştır; POST da güvenle tekrarlanabilir
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+    def _record(self, endpoint, elapsed, size=0, error=False):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {"requests": 0, "errors": 0, "retries": 0, "bytes": 0,
+                                                      "total_s": 0.0, "max_s": 0.0})
+            stats["requests"] += 1
+            stats["errors"] += error
+            stats["bytes"] += size
+            stats["total_s"] += elapsed
+            stats["max_s"] = max(stats["max_s"], elapsed)
+
+    def _record_retry(self, endpoint):
+        with self._lock:
+            self._stats[endpoint]["retries"] += 1
+
+    def connections_opened(self):
+        """Havuzun şimdiye kadar açtığı TCP bağlantısı sayısı (keep-alive etkinliği için)."""
+        pools = self.adapter.poolmanager.pools
+        return sum(getattr(pools[key], "num_connections", 0) for key in pools.keys())
+
+    def stats(self):
+        with self._lock:
+            endpoints = {name: {**values, "mean_s": values["total_s"] / max(values["requests"], 1)}
+                         for name, values in self._stats.items()}
+        return {"connections_opened": self.connections_opened(), "endpoints": endpoints}
+
+    def close(self):
+        self.session.close()
+
 
 class ComfyUIClient:
-    def __init__(self, server_url="127.0.0.1:8188"):
+    def __init__(self, server_url="127.0.0.1:8188", transport=None, encoder=None, upload_index=None):
         self.server_url = server_url
         self.client_id = str(uuid.uuid4())
         self.ws = None
+        # Tüm HTTP çağrıları aynı bağlantı havuzunu paylaşır
+        self.transport = transport or HTTPTransport(server_url)
+        self._compiler = None
+        # Yüklemeler bellekten yapılır ve içerik özetiyle adlandırılır; sunucuda olanlar tekrar yüklenmez
+        self.encoder = encoder or ImageEncoder()
+        self.upload_index = upload_index if upload_index is not None else UploadIndex()
 
         # Sunucu durumunu kontrol et ve gerekirse başlat
         if not self.check_server():
@@ -40,14 +157,14 @@ class ComfyUIClient:
     def check_server(self):
         """ComfyUI sunucusunun çalışıp çalışmadığını kontrol et."""
         try:
-            response = requests.get(f"http://{self.server_url}/")
+            response = self.transport.get("check", "/", retry=False)
             if response.status_code == 200:
                 print("ComfyUI sunucusu çalışıyor.")
                 return True
             else:
                 print(f"Sunucudan beklenmeyen durum kodu alındı: {response.status_code}")
                 return False
-        except requests.exceptions.ConnectionError:
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
             print("ComfyUI sunucusu çalışmıyor.")
             return False
 
@@ -77,10 +194,42 @@ class ComfyUIClient:
                 'type': image_type,
                 'overwrite': str(overwrite).lower(),
             }
-            response = requests.post(f"http://{self.server_url}/upload/image", files=files, data=data)
+            response = self.transport.post("upload", "/upload/image", files=files, data=data)
             response.raise_for_status()
             print(f"Görüntü '{image_name}' başarıyla yüklendi.")
 
+    def upload_bytes(self, data, image_name, image_type="input", overwrite=False, content_type="image/png"):
+        """Bellekteki kodlanmış görüntüyü diske yazmadan yükle; sunucunun verdiği adı döndürür."""
+        files = {
+            'image': (image_name, io.BytesIO(data), content_type),
+        }
+        form = {
+            'type': image_type,
+            'overwrite': str(overwrite).lower(),
+        }
+        response = self.transport.post("upload", "/upload/image", files=files, data=form)
+        response.raise_for_status()
+        return response.json().get("name", image_name)
+
+    def upload_image_data(self, image, image_type="input"):
+        """Görüntüyü kodlar, içerik özetiyle adlandırır ve sunucuda yoksa yükler."""
+        data = self.encoder.encode(image)
+        name = content_name(data, self.encoder.format)
+        state = self.upload_index.lookup(self.server_url, name)
+        if state == "unverified" and self.server_has_image(name, image_type):
+            self.upload_index.add(self.server_url, name)
+            state = "verified"
+        if state == "verified":
+            return name
+        # Aynı ad aynı içerik demektir, bu yüzden üzerine yazmak güvenlidir
+        name = self.upload_bytes(data, name, image_type, overwrite=True, content_type=self.encoder.content_type)
+        self.upload_index.add(self.server_url, name)
+        return name
+
+    def server_has_image(self, name, image_type="input"):
+        response = self.transport.request("HEAD", "view", "/view", params={"filename": name, "type": image_type})
+        return response.status_code == 200
+
     def queue_prompt(self, prompt):
         """İş akışını sunucuya gönder ve prompt_id al."""
         payload = {
@@ -88,7 +237,7 @@ class ComfyUIClient:
             "client_id": self.client_id,
         }
         headers = {'Content-Type': 'application/json'}
-        response = requests.post(f"http://{self.server_url}/prompt", json=payload, headers=headers)
+        response = self.transport.post("prompt", "/prompt", json=payload, headers=headers)
         response.raise_for_status()
         response_data = response.json()
         prompt_id = response_data.get('prompt_id')
@@ -99,7 +248,7 @@ class ComfyUIClient:
 
     def get_history(self, prompt_id):
         """Belirli bir prompt_id için geçmişi al."""
-        response = requests.get(f"http://{self.server_url}/history/{prompt_id}")
+        response = self.transport.get("history", f"/history/{prompt_id}")
         response.raise_for_status()
         return response.json()
 
@@ -110,71 +259,46 @@ class ComfyUIClient:
             "subfolder": subfolder,
             "type": folder_type,
         }
-        response = requests.get(f"http://{self.server_url}/view", params=params)
+        response = self.transport.get("view", "/view", params=params)
         response.raise_for_status()
         return response.content
 
-    def validate_workflow(self,workflow):
-        """İş akışı düğümlerini doğrula ve class_type'ı kontrol et"""
-        for node in workflow['nodes']:
-            # Her node'un bir sözlük olup olmadığını kontrol edin
-            if isinstance(node, dict):
-                if 'class_type' not in node:
-                    print(f"Warning: Node is missing 'class_type': {node}")
-                else:
-                    print(f"Valid node found with class_type: {node['class_type']}")
-            else:
-                print(f"Error: Node is not a dictionary: {node}")
-                raise ValueError(f"Invalid node format: {node}")
+    def get_object_info(self):
+        """Sunucudaki düğüm türlerinin girdi tanımları (UI -> API derlemesi için)."""
+        response = self.transport.get("object_info", "/object_info")
+        response.raise_for_status()
+        return response.json()
+
+    def workflow_compiler(self):
+        if self._compiler is None:
+            try:
+                object_info = self.get_object_info()
+            except requests.exceptions.RequestException as e:
+                print(f"/object_info alınamadı ({e}); yerleşik widget tablosu kullanılacak.")
+                object_info = None
+            self._compiler = WorkflowCompiler(object_info)
+        return self._compiler
+
+    def workflow_template(self, workflow_file=WORKFLOW_FILE):
+        """İş akışını bir kez derler ve doğrular; dosya değişmedikçe önbellekteki şablonu döndürür."""
+        return self.workflow_compiler().load(workflow_file)
+
+    def validate_workflow(self, workflow):
+        """API formatındaki bir prompt'u doğrula (bağlantılar, düğüm türleri, zorunlu girdiler)."""
+        self.workflow_compiler().validate(workflow)
 
     def process_image(self, input_image: QImage, upscale_size: tuple):
         """Görüntüyü ComfyUI'nın iş akışı ile işler."""
-        # Giriş görüntüsünü kaydet
-        image_path = 'input_image.png'
-        input_image.save(image_path)
-
-        # Görüntüyü sunucuya yükle
-        self.upload_image(image_path, 'input_image.png', image_type='input', overwrite=True)
-
-        # İş akışını yükle
-        workflow_file = r"vanGogh_style_transferring_workflow.json"
-        with open(workflow_file, 'r') as f:
-            workflow = json.load(f)
-
-        # İş akışını doğrula (validate)
-        self.validate_workflow(workflow)
-
-        # İş akışını güncelle
-        for node in workflow['nodes']:
-            # Check if node is dict
-            if isinstance(node, dict):
-                if node.get('type') == 'LoadImage':
-                    if isinstance(node.get('inputs'), dict):
-                        node['inputs']['image'] = 'input_image.png'
-                elif node.get('type') == 'LatentUpscale':
-                    upscale_values = node.get('widgets_values', [])
-                    if isinstance(upscale_values, list) and len(upscale_values) >= 3:
-                        try:
-                            width = int(upscale_values[1])
-                            height = int(upscale_values[2])
-                            if isinstance(node.get('inputs'), dict):
-                                node['inputs']['width'] = width
-                                node['inputs']['height'] = height
-                            else:
-                                print(f"'inputs' is not a dictionary for node {node['id']}")
-                        except (ValueError, TypeError) as e:
-                            print(f"Invalid upscale values: {e}")
-                            raise
-                elif node.get('type') == 'CheckpointLoaderSimple':
-                    if isinstance(node.get('inputs'), dict):
-                        node['inputs']['ckpt_name'] = 'your_model_name'  # Kendi model isminizle değiştirin
-            else:
-                print(f"Node is not a dictionary: {node}")
+        # Görüntüyü bellekten, içerik özetiyle adlandırarak yükle (sunucuda varsa atlanır)
+        image_name = self.upload_image_data(input_image)
 
-        # KSampler için rastgele bir seed oluştur
-        for node in workflow['nodes']:
-            if isinstance(node, dict) and node.get('class_type') == 'KSampler':
-                node['inputs']['seed'] = random.randint(0, 2**32 - 1)
+        # Derlenmiş şablondan bu isteğe özel prompt'u üret (yalnızca değişen düğümler kopyalanır)
+        template = self.workflow_template()
+        width, height = upscale_size
+        # Her KSampler kendi rastgele seed'ini alır
+        seeds = {f"{node_id}.{input_name}": random.randint(0, 2**32 - 1)
+                 for node_id, input_name in template.slots.get("seed", [])}
+        workflow = template.instantiate(image=image_name, width=int(width), height=int(height), **seeds)
 
         # Prompt'u kuyruğa al
         prompt_id = self.queue_prompt(workflow)
@@ -221,18 +345,12 @@ class ComfyUIClient:
                         print(f"İlerleme: {len(finished_nodes)}/{len(node_ids)} görev tamamlandı")
                     if node is None and data['prompt_id'] == prompt_id:
                         print("İşlem tamamlandı.")
-                        # Çıktı görüntülerini al
-                        images = self.get_output_images(prompt_id)
+                        # Yalnızca 'output' görüntüleri, paralel ve doğrudan diske akıtılarak indirilir
+                        images = self.get_output_images(prompt_id, types=("output",), destination=".")
                         if images:
-                            # Görüntüyü kaydet
-                            for img in images:
-                                if img['type'] == 'output':
-                                    output_image_data = img['image_data']
-                                    output_image_filename = img['file_name']
-                                    with open(output_image_filename, 'wb') as f:
-                                        f.write(output_image_data)
-                                    print(f"Çıktı görüntüsü kaydedildi: {output_image_filename}")
-                                    return output_image_filename
+                            output_image_filename = images[0]['path']
+                            print(f"Çıktı görüntüsü kaydedildi: {output_image_filename}")
+                            return output_image_filename
                         break
                 elif message['type'] == 'error':
                     error_message = message.get('message', 'Bilinmeyen hata')
@@ -242,22 +360,83 @@ class ComfyUIClient:
 
         return None
 
-    def get_output_images(self, prompt_id):
-        """Belirli bir prompt_id için çıktı görüntülerini al."""
-        output_images = []
+    def get_output_images(self, prompt_id, node_ids=None, types=("output",), destination=None, decode=False,
+                          max_workers=4, chunk_size=256 * 1024):
+        """Belirli bir prompt_id için çıktı görüntülerini al.
+
+        Görüntüler indirilmeden önce düğüme (node_ids) ve türe (types; None = hepsi, temp ve
+        önizlemeler dâhil) göre süzülür, ardından max_workers paralel istekle parça parça
+        akıtılır: destination verilirse sunucudaki alt klasörüyle birlikte doğrudan o klasöre
+        yazılır ('path'; var olan dosyaların üzerine yazılmaz), decode=True ise
+        PIL çözücüsüne beslenir ('image'), aksi hâlde bellekte toplanır ('image_data').
+        Her kayıtta indirme süreleri 'timing' altında yer alır. Sıra geçmişteki sırayla aynıdır.
+        """
         history = self.get_history(prompt_id)[prompt_id]
-        for node_id in history['outputs']:
-            node_output = history['outputs'][node_id]
-            if 'images' in node_output:
-                for image_info in node_output['images']:
-                    image_data = self.get_image(
-                        image_info['filename'],
-                        image_info['subfolder'],
-                        image_info['type']
-                    )
-                    output_images.append({
-                        'file_name': image_info['filename'],
-                        'type': image_info['type'],
-                        'image_data': image_data
-                    })
-        return output_images
+        selected = []
+        for node_id, node_output in history['outputs'].items():
+            if node_ids is not None and node_id not in node_ids:
+                continue
+            for image_info in node_output.get('images', []):
+                if types is None or image_info['type'] in types:
+                    selected.append((node_id, image_info))
+        if not selected:
+            return []
+
+        def download(item):
+            node_id, image_info = item
+            record = {'node_id': node_id, 'file_name': image_info['filename'], 'type': image_info['type']}
+            record.update(self.stream_image(image_info['filename'], image_info['subfolder'], image_info['type'],
+                                            destination, decode, chunk_size))
+            return record
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(selected))) as executor:
+            return list(executor.map(download, selected))
+
+    def stream_image(self, filename, subfolder, folder_type, destination=None, decode=False, chunk_size=256 * 1024):
+        """Tek bir görüntüyü parça parça indirir; tüm gövde hiçbir zaman bellekte tutulmaz (destination/decode)."""
+        params = {
+            "filename": filename,
+            "subfolder": subfolder,
+            "type": folder_type,
+        }
+        start = time.perf_counter()
+        with self.transport.get("view", "/view", params=params, stream=True) as response:
+            response.raise_for_status()
+            first_byte = None
+            size = 0
+            result = {}
+            if destination is not None:
+                path = reserve_output_path(destination, subfolder, filename)
+                tmp_path = f"{path}.part"
+                sink = open(tmp_path, 'wb')
+                feed = sink.write
+            elif decode:
+                from PIL import ImageFile
+                parser = ImageFile.Parser()
+                feed = parser.feed
+            else:
+                chunks = []
+                feed = chunks.append
+            try:
+                for chunk in response.iter_content(chunk_size):
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - start
+                    size += len(chunk)
+                    feed(chunk)
+            except BaseException:
+                if destination is not None:
+                    sink.close()
+                    # Yarım kalan dosya ve ayrılan yol bırakılmaz
+                    os.remove(tmp_path)
+                    os.remove(path)
+                raise
+            if destination is not None:
+                sink.close()
+                os.replace(tmp_path, path)
+                result['path'] = path
+            elif decode:
+                result['image'] = parser.close()
+            else:
+                result['image_data'] = b"".join(chunks)
+        result['timing'] = {'ttfb_s': first_byte or 0.0, 'total_s': time.perf_counter() - start, 'bytes': size}
+        return result
@@ -0,0 +1,443 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+import aiohttp
+
+from upload_cache import ImageEncoder, UploadIndex, content_name, reserve_output_path
+
+# Bir prompt'u sonlandıran WebSocket mesajları
+TERMINAL_ERROR_TYPES = ("execution_error", "execution_interrupted", "error")
+# submit_many akışının sonunu işaretler
+_BULK_DONE = object()
+
+
+class PromptHandle:
+    """Kuyruktaki tek bir prompt'un durumu; sonucu `future` üzerinden bekler."""
+
+    def __init__(self, prompt_id, loop, on_event=None):
+        self.prompt_id = prompt_id
+        self.future = loop.create_future()
+        self.on_event = on_event
+        self.progress = (0, 0)
+        self.current_node = None
+        self.finished_nodes = set()
+
+    def handle(self, message_type, data):
+        if message_type == "progress":
+            self.progress = (data.get("value", 0), data.get("max", 0))
+        elif message_type == "execution_cached":
+            self.finished_nodes.update(data.get("nodes", []))
+        elif message_type == "executing" and data.get("node") is not None:
+            if self.current_node is not None:
+                self.finished_nodes.add(self.current_node)
+            self.current_node = data["node"]
+        if self.on_event is not None:
+            try:
+                self.on_event(self, message_type, data)
+            except Exception as e:
+                # Kullanıcı geri çağrısındaki hata prompt'un izlenmesini durdurmamalı
+                print(f"on_event geri çağrısı hata verdi ({self.prompt_id}): {e!r}")
+
+    def finish(self, error=None):
+        if self.future.done():
+            return
+        if error is None:
+            self.future.set_result(self.prompt_id)
+        else:
+            self.future.set_exception(error)
+
+
+class AsyncComfyUIClient:
+    """Tek bir kalıcı WebSocket üzerinden çok sayıda prompt'u eşzamanlı yürüten asyncio istemcisi.
+
+    Aynı client_id ile açılan tek WebSocket'ten gelen `progress`, `executing`,
+    `execution_cached` ve hata mesajları prompt_id'ye göre ilgili PromptHandle'a
+    dağıtılır. Bağlantı koparsa üstel geri çekilmeyle yeniden kurulur; kopukluk
+    sırasında biten prompt'lar /history üzerinden tamamlanır.
+
+        async with AsyncComfyUIClient("127.0.0.1:8188") as client:
+            results = await asyncio.gather(*(client.run(prompt) for prompt in prompts))
+    """
+
+    def __init__(self, server_url="127.0.0.1:8188", client_id=None, max_connections=32,
+                 reconnect_delay=0.5, max_reconnect_delay=30.0, request_timeout=60, connect_timeout=30,
+                 encoder=None, upload_index=None):
+        self.server_url = server_url
+        self.client_id = client_id or str(uuid.uuid4())
+        self.max_connections = max_connections
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.request_timeout = aiohttp.ClientTimeout(total=request_timeout)
+        self.connect_timeout = connect_timeout
+        self.session = None
+        self.handles = {}
+        # Kayıttan önce gelen sonlanma mesajları (POST yanıtı WebSocket mesajından geç gelebilir)
+        self._early_events = {}
+        self._running_prompt = None
+        self._listener = None
+        self._connected = None
+        self._history_tasks = set()
+        self.reconnects = 0
+        self.encoder = encoder or ImageEncoder()
+        self.upload_index = upload_index if upload_index is not None else UploadIndex()
+        # Aynı içeriğin eşzamanlı yüklemeleri tek bir isteği paylaşır
+        self._uploads = {}
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def connect(self):
+        """HTTP bağlantı havuzunu ve WebSocket dinleyicisini başlatır."""
+        connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.request_timeout)
+        self._connected = asyncio.Event()
+        self._listener = asyncio.create_task(self._listen())
+        self._listener.add_done_callback(self._listener_done)
+        try:
+            await asyncio.wait_for(self._connected.wait(), self.connect_timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise ConnectionError(f"ComfyUI sunucusuna bağlanılamadı: {self.server_url}")
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                pass  # _listener_done bildirdi ve bekleyen prompt'ları sonlandırdı
+        for task in list(self._history_tasks):
+            task.cancel()
+        for handle in self.handles.values():
+            handle.finish(ConnectionError("İstemci kapatıldı"))
+        if self.session is not None:
+            await self.session.close()
+
+    async def _listen(self):
+        delay = self.reconnect_delay
+        while True:
+            try:
+                async with self.session.ws_connect(f"ws://{self.server_url}/ws?clientId={self.client_id}",
+                                                   heartbeat=30) as ws:
+                    delay = self.reconnect_delay
+                    if self._connected.is_set():
+                        # Yeniden bağlanıldı: kopukken biten prompt'ları geçmişten tamamla
+                        self.reconnects += 1
+                        task = asyncio.create_task(self._resolve_from_history())
+                        self._history_tasks.add(task)
+                        task.add_done_callback(self._history_task_done)
+                    self._connected.set()
+                    async for message in ws:
+                        if message.type == aiohttp.WSMsgType.TEXT:
+                            try:
+                                self._dispatch(json.loads(message.data))
+                            except Exception as e:
+                                # Tek bir bozuk mesaj dinleyiciyi (ve tüm bekleyen prompt'ları) düşürmemeli
+                                print(f"WebSocket mesajı işlenemedi: {e!r}")
+                        elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+                        # Binary mesajlar (önizleme kareleri) yok sayılır
+            except asyncio.CancelledError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"WebSocket bağlantısı koptu: {e}; {delay:.1f} sn sonra yeniden denenecek")
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(self.max_reconnect_delay, delay * 2)
+
+    def _listener_done(self, task):
+        # Dinleyici yalnızca close() ile iptal edilerek bitmeli; başka bir nedenle biterse
+        # hiçbir prompt artık tamamlanamaz, bu yüzden hepsi hatayla sonlandırılır
+        if task.cancelled():
+            return
+        error = task.exception()
+        print(f"WebSocket dinleyicisi beklenmedik şekilde durdu: {error!r}")
+        for handle in list(self.handles.values()):
+            handle.finish(ConnectionError(f"WebSocket dinleyicisi durdu: {error!r}"))
+
+    def _dispatch(self, message):
+        message_type = message.get("type")
+        data = message.get("data")
+        if not isinstance(data, dict):
+            return
+        prompt_id = data.get("prompt_id")
+        if message_type == "executing" and prompt_id:
+            self._running_prompt = prompt_id if data.get("node") is not None else None
+        if prompt_id is None and message_type == "progress":
+            # Eski sunucular progress mesajına prompt_id eklemez; o an çalışan prompt'a aittir
+            prompt_id = self._running_prompt
+        if prompt_id is None:
+            return
+
+        handle = self.handles.get(prompt_id)
+        done = message_type == "execution_success" or (message_type == "executing" and data.get("node") is None)
+        if handle is None:
+            # ComfyUI bir hatadan sonra executing {node: None} da gönderir; ilk hata saklanır,
+            # sonraki "bitti" mesajı onu ezip prompt'u başarılı göstermez
+            previous = self._early_events.get(prompt_id)
+            if (done or message_type in TERMINAL_ERROR_TYPES) and (
+                    previous is None or previous[0] not in TERMINAL_ERROR_TYPES):
+                self._early_events[prompt_id] = (message_type, data)
+            return
+        handle.handle(message_type, data)
+        if done:
+            handle.finish()
+        elif message_type in TERMINAL_ERROR_TYPES:
+            handle.finish(RuntimeError(f"İşlem sırasında hata oluştu: {data.get('exception_message', data)}"))
+
+    async def _resolve_from_history(self):
+        for prompt_id, handle in list(self.handles.items()):
+            if handle.future.done():
+                continue
+            entry = (await self.get_history(prompt_id)).get(prompt_id)
+            if not entry:
+                continue  # Hâlâ kuyrukta ya da çalışıyor; WebSocket mesajları tamamlayacak
+            status = entry.get("status") or {}
+            if status.get("status_str") == "error":
+                handle.finish(RuntimeError(f"İşlem sırasında hata oluştu: {self._history_error(status)}"))
+            else:
+                handle.finish()
+
+    @staticmethod
+    def _history_error(status):
+        # Geçmişteki hata mesajı, WebSocket'teki execution_error verisinin aynısıdır
+        for message_type, data in status.get("messages", []):
+            if message_type in TERMINAL_ERROR_TYPES:
+                return data.get("exception_message", data)
+        return "bilinmeyen hata"
+
+    def _history_task_done(self, task):
+        self._history_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Kopukluk sonrası geçmişten tamamlama başarısız: {task.exception()!r}")
+
+    async def queue_prompt(self, prompt, on_event=None):
+        """Prompt'u kuyruğa alır ve bekleyen bir PromptHandle döndürür."""
+        if self._listener is None or self._listener.done():
+            raise ConnectionError("WebSocket dinleyicisi çalışmıyor; istemci bağlı değil")
+        payload = {"prompt": prompt, "client_id": self.client_id}
+        async with self.session.post(f"http://{self.server_url}/prompt", json=payload) as response:
+            response.raise_for_status()
+            prompt_id = (await response.json()).get("prompt_id")
+        if not prompt_id:
+            raise ValueError("Sunucudan prompt_id alınamadı")
+        handle = PromptHandle(prompt_id, asyncio.get_running_loop(), on_event)
+        self.handles[prompt_id] = handle
+        early = self._early_events.pop(prompt_id, None)
+        if early is not None:
+            self._dispatch({"type": early[0], "data": early[1]})
+        return handle
+
+    async def wait(self, handle, timeout=None):
+        """Prompt bitene kadar bekler ve /history'deki çıktılarını döndürür."""
+        try:
+            await asyncio.wait_for(asyncio.shield(handle.future), timeout)
+        finally:
+            if handle.future.done():
+                self.handles.pop(handle.prompt_id, None)
+        history = await self.get_history(handle.prompt_id)
+        return history.get(handle.prompt_id, {}).get("outputs", {})
+
+    async def run(self, prompt, on_event=None, timeout=None):
+        handle = await self.queue_prompt(prompt, on_event)
+        return await self.wait(handle, timeout)
+
+    async def get_history(self, prompt_id):
+        async with self.session.get(f"http://{self.server_url}/history/{prompt_id}") as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def get_image(self, filename, subfolder, folder_type):
+        params = {"filename": filename, "subfolder": subfolder, "type": folder_type}
+        async with self.session.get(f"http://{self.server_url}/view", params=params) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    async def get_output_images(self, outputs, node_ids=None, types=("output",), destination=None,
+                                max_parallel=4, chunk_size=256 * 1024):
+        """/history çıktılarından süzülen görüntüleri paralel indirir (ComfyUIClient.get_output_images ile aynı kayıtlar).
+
+        destination verilirse gövde parça parça doğrudan diske, sunucudaki alt klasörüyle birlikte
+        yazılır (var olan dosyaların üzerine yazılmaz); yoksa bellekte toplanır.
+        """
+        selected = [(node_id, image_info) for node_id, node_output in outputs.items()
+                    if node_ids is None or node_id in node_ids
+                    for image_info in node_output.get("images", []) if types is None or image_info["type"] in types]
+        limit = asyncio.Semaphore(max_parallel)
+
+        async def download(node_id, image_info):
+            record = {"node_id": node_id, "file_name": image_info["filename"], "type": image_info["type"]}
+            params = {"filename": image_info["filename"], "subfolder": image_info["subfolder"],
+                      "type": image_info["type"]}
+            async with limit:
+                start = time.perf_counter()
+                first_byte, size, chunks = None, 0, []
+                async with self.session.get(f"http://{self.server_url}/view", params=params) as response:
+                    response.raise_for_status()
+                    if destination is not None:
+                        record["path"] = await asyncio.to_thread(reserve_output_path, destination,
+                                                                 image_info["subfolder"], image_info["filename"])
+                        sink = await asyncio.to_thread(open, f"{record['path']}.part", "wb")
+                    try:
+                        async for chunk in response.content.iter_chunked(chunk_size):
+                            if first_byte is None:
+                                first_byte = time.perf_counter() - start
+                            size += len(chunk)
+                            if destination is not None:
+                                await asyncio.to_thread(sink.write, chunk)
+                            else:
+                                chunks.append(chunk)
+                    except BaseException:
+                        if destination is not None:
+                            sink.close()
+                            # Yarım kalan dosya ve ayrılan yol bırakılmaz
+                            os.remove(f"{record['path']}.part")
+                            os.remove(record["path"])
+                        raise
+                if destination is not None:
+                    sink.close()
+                    os.replace(f"{record['path']}.part", record["path"])
+                else:
+                    record["image_data"] = b"".join(chunks)
+            record["timing"] = {"ttfb_s": first_byte or 0.0, "total_s": time.perf_counter() - start, "bytes": size}
+            return record
+
+        return await asyncio.gather(*(download(node_id, image_info) for node_id, image_info in selected))
+
+    async def upload_image(self, image_bytes, image_name, image_type="input", overwrite=False,
+                           content_type="image/png"):
+        form = aiohttp.FormData()
+        form.add_field("image", image_bytes, filename=image_name, content_type=content_type)
+        form.add_field("type", image_type)
+        form.add_field("overwrite", str(overwrite).lower())
+        async with self.session.post(f"http://{self.server_url}/upload/image", data=form) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def upload_image_data(self, image, image_type="input"):
+        """Görüntüyü bellekte kodlar, içerik özetiyle adlandırır ve sunucuda yoksa yükler."""
+        data = await asyncio.to_thread(self.encoder.encode, image)
+        name = content_name(data, self.encoder.format)
+        key = (name, image_type)
+        upload = self._uploads.get(key)
+        if upload is None:
+            upload = asyncio.ensure_future(self._upload_once(data, name, image_type))
+            self._uploads[key] = upload
+            # Başarısız yükleme önbellekte kalmaz, sonraki çağrı yeniden dener
+            upload.add_done_callback(
+                lambda task: (task.cancelled() or task.exception()) and self._uploads.pop(key, None))
+        return await asyncio.shield(upload)
+
+    async def _upload_once(self, data, name, image_type):
+        state = self.upload_index.lookup(self.server_url, name)
+        if state == "unverified":
+            params = {"filename": name, "type": image_type}
+            async with self.session.head(f"http://{self.server_url}/view", params=params) as response:
+                state = "verified" if response.status == 200 else None
+        if state != "verified":
+            # Aynı ad aynı içerik demektir, bu yüzden üzerine yazmak güvenlidir
+            uploaded = await self.upload_image(data, name, image_type, overwrite=True,
+                                               content_type=self.encoder.content_type)
+            name = uploaded.get("name", name)
+        await asyncio.to_thread(self.upload_index.add, self.server_url, name)
+        return name
+
+    def in_flight(self):
+        return sum(not handle.future.done() for handle in self.handles.values())
+
+    async def submit_many(self, items, build_prompt, max_in_flight=8, upload_concurrency=4, timeout=None,
+                          download_outputs=False, output_dir=None):
+        """Görüntüleri boru hattı (pipeline) hâlinde işler ve sonuçları bittikçe akış olarak verir.
+
+        items: (key, image, params) üçlülerinden oluşan herhangi bir iterable; image
+        QImage, PIL.Image, kodlanmış bayt dizisi ya da dosya yoludur ve ihtiyaç oldukça
+        okunur. Aynı içerik yalnızca bir kez yüklenir. build_prompt(image_name, params)
+        yüklenen görüntü adıyla API prompt'unu üretir. Aynı anda en fazla max_in_flight
+        görüntü yükleme-kuyruk-çalışma aşamalarında bulunur; yüklemeler diğer görüntülerin
+        kuyruğa alınması ve çalışmasıyla örtüşür. download_outputs=True ise "output" türündeki
+        görüntüler paralel indirilir; output_dir verilirse doğrudan diske akıtılır. Sonuçlar
+        tamamlanma sırasıyla gelir:
+
+            async for result in client.submit_many(items, build_prompt, max_in_flight=16):
+                print(result["key"], result.get("error") or result["prompt_id"])
+        """
+        in_flight = asyncio.Semaphore(max_in_flight)
+        uploads = asyncio.Semaphore(upload_concurrency)
+        results = asyncio.Queue()
+        tasks = set()
+
+        async def process(index, key, image, params):
+            result = {"index": index, "key": key, "timings": {}}
+            try:
+                if isinstance(image, (str, os.PathLike)):
+                    image = await asyncio.to_thread(_read_file, image)
+                start = time.perf_counter()
+                async with uploads:
+                    result["image_name"] = await self.upload_image_data(image)
+                result["timings"]["upload_s"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                handle = await self.queue_prompt(build_prompt(result["image_name"], params))
+                result["prompt_id"] = handle.prompt_id
+                result["timings"]["queue_s"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                result["outputs"] = await self.wait(handle, timeout)
+                result["timings"]["run_s"] = time.perf_counter() - start
+                if download_outputs:
+                    result["images"] = await self.get_output_images(result["outputs"], destination=output_dir)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result["error"] = str(e)
+            await results.put(result)
+
+        async def feed():
+            try:
+                for index, (key, image, params) in enumerate(items):
+                    await in_flight.acquire()
+                    task = asyncio.create_task(process(index, key, image, params))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                if tasks:
+                    await asyncio.gather(*tasks)
+            finally:
+                await results.put(_BULK_DONE)
+
+        feeder = asyncio.create_task(feed())
+        try:
+            while True:
+                result = await results.get()
+                if result is _BULK_DONE:
+                    break
+                yield result
+                # Slot, sonuç tüketiciye verildikten sonra boşalır; yavaş bir tüketicide
+                # biten sonuçlar (ve indirilen görüntüler) max_in_flight'ı aşacak kadar birikmez
+                in_flight.release()
+            await feeder  # Besleyicideki hatalar (ör. items iterable'ı) çağırana iletilir
+        finally:
+            # Tüketici erken çıkarsa kalan işler iptal edilir
+            for task in [feeder, *tasks]:
+                task.cancel()
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def bulk_process(items, build_prompt, server_url="127.0.0.1:8188", **kwargs):
+    """submit_many için senkron kısayol; tüm sonuçları liste olarak döndürür."""
+    async def collect():
+        async with AsyncComfyUIClient(server_url) as client:
+            return [result async for result in client.submit_many(items, build_prompt, **kwargs)]
+    return asyncio.run(collect())
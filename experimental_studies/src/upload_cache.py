@@ -0,0 +1,132 @@
+import hashlib
+import io
+import itertools
+import json
+import os
+import threading
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "comfyui_client", "upload_index.json")
+
+
+class ImageEncoder:
+    """Görüntüleri diske yazmadan bellekte kodlar.
+
+    format="png": compress_level 0-9 (düşük = hızlı, büyük dosya).
+    format="webp": kayıpsız WebP (Qt'de webp eklentisi ya da Pillow gerekir).
+    Desteklenen girdiler: QImage, PIL.Image ve zaten kodlanmış bayt dizisi.
+    """
+
+    CONTENT_TYPES = {"png": "image/png", "webp": "image/webp"}
+
+    def __init__(self, format="png", compress_level=1):
+        if format not in self.CONTENT_TYPES:
+            raise ValueError(f"Desteklenmeyen kodlama biçimi: {format}")
+        self.format = format
+        self.compress_level = compress_level
+
+    @property
+    def content_type(self):
+        return self.CONTENT_TYPES[self.format]
+
+    def encode(self, image):
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return bytes(image)
+        if hasattr(image, "bits") and hasattr(image, "save"):  # QImage
+            return self._encode_qimage(image)
+        if hasattr(image, "save"):  # PIL.Image
+            buffer = io.BytesIO()
+            if self.format == "png":
+                image.save(buffer, format="PNG", compress_level=self.compress_level)
+            else:
+                image.save(buffer, format="WEBP", lossless=True, method=0)
+            return buffer.getvalue()
+        raise TypeError(f"Kodlanamayan görüntü türü: {type(image).__name__}")
+
+    def _encode_qimage(self, image):
+        from PyQt5.QtCore import QBuffer, QByteArray, QIODevice
+
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        # Qt PNG kalite değeri sıkıştırmanın tersidir (100 = sıkıştırmasız); WebP'de 100 kayıpsızdır
+        quality = 100 - round(self.compress_level * 100 / 9) if self.format == "png" else 100
+        if not image.save(buffer, self.format.upper(), quality):
+            raise RuntimeError(f"QImage {self.format.upper()} olarak kodlanamadı (Qt eklentisi eksik olabilir)")
+        buffer.close()
+        return bytes(data)
+
+
+def content_name(data, extension):
+    """İçerikten türetilen dosya adı: aynı görüntü her zaman aynı adla yüklenir."""
+    return f"{hashlib.blake2b(data, digest_size=16).hexdigest()}.{extension}"
+
+
+def reserve_output_path(destination, subfolder, filename):
+    """İndirilen bir çıktı için destination/subfolder altında kullanılmayan bir yol ayırır.
+
+    Sunucudaki alt klasör korunur; aynı ad zaten varsa (ör. başka bir prompt'tan) _1, _2 ...
+    eklenir. Yol boş bir dosya oluşturularak ayrılır, böylece paralel indirmeler çakışmaz.
+    """
+    subfolder = os.path.normpath(subfolder or "")
+    if os.path.isabs(subfolder) or subfolder.split(os.sep)[0] == "..":
+        raise ValueError(f"Geçersiz alt klasör: {subfolder}")
+    folder = destination if subfolder == "." else os.path.join(destination, subfolder)
+    os.makedirs(folder, exist_ok=True)
+    stem, extension = os.path.splitext(os.path.basename(filename))
+    for counter in itertools.count():
+        path = os.path.join(folder, f"{stem}_{counter}{extension}" if counter else f"{stem}{extension}")
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return path
+        except FileExistsError:
+            continue
+
+
+class UploadIndex:
+    """Sunucuya daha önce yüklenmiş içerik adlarının yerel dizini (sunucu adresi başına).
+
+    Diskteki kayıtlar başka bir oturumdan geldiği için ilk kullanımda sunucuda hâlâ
+    durup durmadıkları doğrulanır; bu oturumda yüklenen ya da doğrulanan adlar tekrar
+    kontrol edilmez.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._known = {}
+        self._verified = set()
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._known = {server: set(names) for server, names in json.load(f).items()}
+            except (OSError, ValueError) as e:
+                print(f"Yükleme dizini okunamadı, yeniden oluşturulacak: {e}")
+
+    def lookup(self, server, name):
+        """'verified', 'unverified' ya da None döndürür."""
+        with self._lock:
+            if (server, name) in self._verified:
+                return "verified"
+            return "unverified" if name in self._known.get(server, ()) else None
+
+    def add(self, server, name):
+        with self._lock:
+            self._known.setdefault(server, set()).add(name)
+            self._verified.add((server, name))
+        self.save()
+
+    def discard(self, server, name):
+        with self._lock:
+            self._known.get(server, set()).discard(name)
+            self._verified.discard((server, name))
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            snapshot = {server: sorted(names) for server, names in self._known.items()}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,295 @@
+import copy
+import json
+import os
+import threading
+
+# Sunucudan /object_info alınamadığında kullanılan widget sıraları (UI widgets_values -> API input adları).
+# None, API'ye gönderilmeyen yardımcı widget'ları (seed'den sonraki control_after_generate, upload) atlar.
+BUILTIN_WIDGETS = {
+    "KSampler": ["seed", None, "steps", "cfg", "sampler_name", "scheduler", "denoise"],
+    "KSamplerAdvanced": ["add_noise", "noise_seed", None, "steps", "cfg", "sampler_name", "scheduler",
+                         "start_at_step", "end_at_step", "return_with_leftover_noise"],
+    "CLIPTextEncode": ["text"],
+    "ControlNetApply": ["strength"],
+    "ControlNetLoader": ["control_net_name"],
+    "EmptyLatentImage": ["width", "height", "batch_size"],
+    "CheckpointLoaderSimple": ["ckpt_name"],
+    "CannyEdgePreprocessor": ["low_threshold", "high_threshold", "resolution"],
+    "Canny": ["low_threshold", "high_threshold"],
+    "ImageScale": ["upscale_method", "width", "height", "crop"],
+    "LatentUpscale": ["upscale_method", "width", "height", "crop"],
+    "LatentUpscaleBy": ["upscale_method", "scale_by"],
+    "LoadImage": ["image", None],
+    "SaveImage": ["filename_prefix"],
+    "PreviewImage": [],
+    "VAEDecode": [],
+    "VAEEncode": [],
+}
+BUILTIN_OUTPUT_NODES = {"SaveImage", "PreviewImage", "ShowText|pysssss"}
+WIDGET_TYPES = ("INT", "FLOAT", "STRING", "BOOLEAN")
+# UI modları: 2 = devre dışı (muted), 4 = atlanan (bypass)
+MODE_MUTED, MODE_BYPASS = 2, 4
+
+
+class WorkflowCompileError(ValueError):
+    pass
+
+
+def widget_layout(object_info, class_type):
+    """Bir düğüm türünün UI widget sırası; object_info yoksa yerleşik tabloya düşer."""
+    info = (object_info or {}).get(class_type)
+    if info is None:
+        if class_type not in BUILTIN_WIDGETS:
+            raise WorkflowCompileError(f"'{class_type}' için widget bilgisi yok; sunucunun /object_info çıktısı gerekli")
+        return BUILTIN_WIDGETS[class_type]
+    layout = []
+    inputs = info.get("input", {})
+    for section in ("required", "optional"):
+        for name, spec in inputs.get(section, {}).items():
+            input_type = spec[0]
+            options = spec[1] if len(spec) > 1 and isinstance(spec[1], dict) else {}
+            if not (isinstance(input_type, list) or input_type in WIDGET_TYPES):
+                continue  # Bağlantı girdisi (IMAGE, MODEL, ...)
+            layout.append(name)
+            if options.get("control_after_generate") or (input_type == "INT" and name in ("seed", "noise_seed")):
+                layout.append(None)
+            if options.get("image_upload"):
+                layout.append(None)
+    return layout
+
+
+def is_output_node(object_info, class_type):
+    info = (object_info or {}).get(class_type)
+    return info.get("output_node", False) if info else class_type in BUILTIN_OUTPUT_NODES
+
+
+class WorkflowTemplate:
+    """Derlenmiş API prompt'u ve adlandırılmış parametre yuvaları (slot).
+
+    Her yuva bir ya da daha çok (düğüm_id, girdi_adı) hedefine karşılık gelir. Ayrıca
+    her girdi "düğüm_id.girdi_adı" biçiminde doğrudan adreslenebilir. instantiate()
+    yalnızca değişen düğümleri kopyalar (copy-on-write); şablonun kendisi hiç değişmez.
+    """
+
+    def __init__(self, prompt, slots):
+        self.prompt = prompt
+        self.slots = slots
+
+    def instantiate(self, **params):
+        prompt = dict(self.prompt)
+        copied = set()
+        for name, value in params.items():
+            if value is None:
+                continue
+            targets = self.slots.get(name)
+            if targets is None:
+                node_id, _, input_name = name.partition(".")
+                if node_id not in self.prompt or input_name not in self.prompt[node_id]["inputs"]:
+                    raise KeyError(f"Bilinmeyen şablon parametresi: {name}")
+                targets = [(node_id, input_name)]
+            for node_id, input_name in targets:
+                if node_id not in copied:
+                    prompt[node_id] = {**prompt[node_id], "inputs": dict(prompt[node_id]["inputs"])}
+                    copied.add(node_id)
+                prompt[node_id]["inputs"][input_name] = value
+        return prompt
+
+    def parameters(self):
+        return {name: [self.prompt[node_id]["inputs"][input_name] for node_id, input_name in targets]
+                for name, targets in self.slots.items()}
+
+
+class WorkflowCompiler:
+    """Kaydedilmiş UI iş akışını (workflow/... grup düğümleri dâhil) API prompt formatına derler.
+
+    Derleme ve doğrulama dosya başına bir kez yapılır; sonuç dosyanın değişme zamanına
+    göre önbelleğe alınır.
+    """
+
+    def __init__(self, object_info=None):
+        self.object_info = object_info
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def load(self, path):
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            template = self.compile(json.load(f))
+        with self._lock:
+            self._cache[path] = (mtime, template)
+        return template
+
+    def compile(self, workflow):
+        if "nodes" not in workflow:
+            # Zaten API formatında
+            prompt = copy.deepcopy(workflow)
+        else:
+            prompt = self._compile_ui(workflow)
+        self.validate(prompt)
+        return WorkflowTemplate(prompt, default_slots(prompt))
+
+    def _compile_ui(self, workflow):
+        group_defs = workflow.get("extra", {}).get("groupNodes", {})
+        links = {link[0]: link for link in workflow.get("links", [])}
+        nodes = {}  # api_id -> {"class_type", "inputs", "mode"}
+        # (ui_node_id, output_slot) -> (api_id, slot); grup düğümlerinin çıktıları iç düğümlere yönlenir
+        outputs = {}
+        # (ui_node_id, input_index) -> (api_id, input_name); grup girdileri iç düğümlere yönlenir
+        pending_inputs = []
+
+        for node in workflow["nodes"]:
+            if node.get("mode") == MODE_MUTED:
+                continue
+            node_type = node["type"]
+            if node_type.startswith("workflow/"):
+                self._expand_group(node, group_defs.get(node_type[len("workflow/"):]), outputs, nodes, pending_inputs)
+                continue
+            if node_type in ("Reroute", "Note", "PrimitiveNode"):
+                raise WorkflowCompileError(f"Desteklenmeyen yardımcı düğüm: {node_type} ({node['id']})")
+            api_id = str(node["id"])
+            nodes[api_id] = {"class_type": node_type, "inputs": {}, "mode": node.get("mode", 0)}
+            self._apply_widgets(nodes[api_id], node)
+            for slot in range(len(node.get("outputs", []))):
+                outputs[(node["id"], slot)] = (api_id, slot)
+            for node_input in node.get("inputs", []):
+                pending_inputs.append((api_id, node_input["name"], node_input.get("link")))
+
+        for api_id, input_name, link_id in pending_inputs:
+            if link_id is None:
+                continue
+            link = links.get(link_id)
+            if link is None:
+                raise WorkflowCompileError(f"Düğüm {api_id} bilinmeyen bağlantıya işaret ediyor: {link_id}")
+            source = outputs.get((link[1], link[2]))
+            if source is not None:
+                nodes[api_id]["inputs"][input_name] = list(source)
+
+        self._resolve_bypassed(nodes)
+        return self._prune(nodes)
+
+    def _apply_widgets(self, api_node, ui_node, values=None):
+        values = ui_node.get("widgets_values") if values is None else values
+        if isinstance(values, dict):  # Bazı özel düğümler widget'ları adla saklar
+            api_node["inputs"].update(values)
+            return 0
+        layout = widget_layout(self.object_info, api_node["class_type"])
+        for name, value in zip(layout, values or []):
+            if name is not None:
+                api_node["inputs"][name] = value
+        return len(layout)
+
+    def _expand_group(self, group_node, definition, outputs, nodes, pending_inputs):
+        if definition is None:
+            raise WorkflowCompileError(f"Grup düğümü tanımı bulunamadı: {group_node['type']}")
+        inner_nodes = definition["nodes"]
+        inner_links = definition.get("links", [])
+        linked_outputs = {(link[0], link[1]) for link in inner_links}
+        linked_inputs = {(link[2], link[3]) for link in inner_links}
+        external = {(entry[0], entry[1]) for entry in definition.get("external", [])}
+
+        values = list(group_node.get("widgets_values") or [])
+        outer_slot = 0
+        free_inputs = []
+        for index, inner in enumerate(inner_nodes):
+            api_id = f"{group_node['id']}:{index}"
+            api_node = {"class_type": inner["type"], "inputs": {}, "mode": group_node.get("mode", 0)}
+            consumed = self._apply_widgets(api_node, inner, values)
+            values = values[consumed:]
+            nodes[api_id] = api_node
+            for slot in range(len(inner.get("outputs", []))):
+                # İçeride bağlı olmayan ya da dışarı açılmış her çıktı, grup düğümünün sıradaki çıkışıdır
+                if (index, slot) not in linked_outputs or (index, slot) in external:
+                    outputs[(group_node["id"], outer_slot)] = (api_id, slot)
+                    outer_slot += 1
+            for input_index, inner_input in enumerate(inner.get("inputs", [])):
+                if (index, input_index) not in linked_inputs:
+                    free_inputs.append((api_id, inner_input["name"]))
+        for link in inner_links:
+            source_id, target_id = f"{group_node['id']}:{link[0]}", f"{group_node['id']}:{link[2]}"
+            target_name = inner_nodes[link[2]]["inputs"][link[3]]["name"]
+            nodes[target_id]["inputs"][target_name] = [source_id, link[1]]
+        # Grubun dış girdileri, iç düğümlerin bağlanmamış girdilerine sırayla karşılık gelir
+        for (api_id, input_name), outer_input in zip(free_inputs, group_node.get("inputs", [])):
+            pending_inputs.append((api_id, input_name, outer_input.get("link")))
+
+    def _resolve_bypassed(self, nodes):
+        # Atlanan düğüme giden bağlantı, aynı türden ilk girdisinin kaynağına aktarılır
+        def resolve(source, depth=0):
+            node = nodes.get(source[0])
+            if node is None or node["mode"] != MODE_BYPASS or depth > len(nodes):
+                return source
+            for value in node["inputs"].values():
+                if isinstance(value, list):
+                    return resolve(value, depth + 1)
+            return source
+
+        for node in nodes.values():
+            for name, value in node["inputs"].items():
+                if isinstance(value, list):
+                    node["inputs"][name] = resolve(value)
+        for api_id in [api_id for api_id, node in nodes.items() if node["mode"] == MODE_BYPASS]:
+            del nodes[api_id]
+
+    def _prune(self, nodes):
+        # Yalnızca çıktı düğümlerine ulaşan düğümler prompt'a girer (bağlantısız Canny vb. atılır)
+        required = set()
+        stack = [api_id for api_id, node in nodes.items() if is_output_node(self.object_info, node["class_type"])]
+        if not stack:
+            raise WorkflowCompileError("İş akışında çıktı düğümü (SaveImage vb.) yok")
+        while stack:
+            api_id = stack.pop()
+            if api_id in required:
+                continue
+            required.add(api_id)
+            stack.extend(value[0] for value in nodes[api_id]["inputs"].values() if isinstance(value, list))
+        return {api_id: {"class_type": node["class_type"], "inputs": node["inputs"]}
+                for api_id, node in nodes.items() if api_id in required}
+
+    def validate(self, prompt):
+        """Bağlantıları ve (object_info varsa) zorunlu girdileri bir kez doğrular."""
+        errors = []
+        for api_id, node in prompt.items():
+            if "class_type" not in node:
+                errors.append(f"{api_id}: class_type eksik")
+                continue
+            for name, value in node["inputs"].items():
+                if isinstance(value, list) and value[0] not in prompt:
+                    errors.append(f"{api_id}.{name}: bilinmeyen düğüme bağlı ({value[0]})")
+            info = (self.object_info or {}).get(node["class_type"])
+            if self.object_info is not None and info is None:
+                errors.append(f"{api_id}: sunucuda bilinmeyen düğüm türü {node['class_type']}")
+            elif info is not None:
+                missing = set(info.get("input", {}).get("required", {})) - set(node["inputs"])
+                if missing:
+                    errors.append(f"{api_id} ({node['class_type']}): zorunlu girdiler eksik: {', '.join(sorted(missing))}")
+        if errors:
+            raise WorkflowCompileError("İş akışı doğrulanamadı:\n" + "\n".join(errors))
+
+
+def default_slots(prompt):
+    """Yaygın parametreler için adlandırılmış yuvalar: görüntü, boyut, seed, adım, cfg, ControlNet gücü."""
+    def targets(class_types, input_name, first_only=False):
+        found = sorted(((api_id, input_name) for api_id, node in prompt.items()
+                        if node["class_type"] in class_types and input_name in node["inputs"]),
+                       key=lambda target: _node_order(target[0]))
+        return found[:1] if first_only else found
+
+    slots = {
+        "image": targets(("LoadImage",), "image"),
+        "width": targets(("LatentUpscale",), "width"),
+        "height": targets(("LatentUpscale",), "height"),
+        "seed": targets(("KSampler",), "seed") + targets(("KSamplerAdvanced",), "noise_seed"),
+        # Adım ve cfg ilk (temel) örnekleyiciye uygulanır; diğerleri "düğüm_id.steps" ile ayarlanır
+        "steps": targets(("KSampler", "KSamplerAdvanced"), "steps", first_only=True),
+        "cfg": targets(("KSampler", "KSamplerAdvanced"), "cfg", first_only=True),
+        "controlnet_strength": targets(("ControlNetApply", "ControlNetApplyAdvanced"), "strength"),
+    }
+    return {name: found for name, found in slots.items() if found}
+
+
+def _node_order(api_id):
+    return tuple(int(part) if part.isdigit() else part for part in api_id.split(":"))
@@ -0,0 +1,207 @@
+"""Benchmark suite for the PerformanceMeasurement metrics engine.
+
+Runs every PerformanceMeasurement metric method on synthetic images and on the
+sample_outputs pairs at several resolutions and batch sizes, and reports latency
+percentiles, throughput and peak memory. Results can be saved as a baseline and later
+runs compared against it; regressions beyond the threshold make the script exit non-zero.
+
+    python benchmark_performance_measurement.py --save-baseline performance/benchmark_baseline.json
+    python benchmark_performance_measurement.py --compare performance/benchmark_baseline.json --threshold 0.10
+    python benchmark_performance_measurement.py --sizes 512 --batch-sizes 1 --methods ssim batch_metrics
+"""
+import argparse
+import json
+import platform
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+
+from evaluation_utils import SAMPLE_OUTPUTS_DIR, find_sample_pairs, import_performance_node, load_image
+
+BENCHMARKS = {
+    "ssim": lambda pm, a, b: pm.calculate_ssim(a, b),
+    "ssim_batch": lambda pm, a, b: pm.calculate_ssim_batch(a, b),
+    "ssim_batch_streaming": lambda pm, a, b: pm.calculate_ssim_batch_streaming(a, b, band_rows=128),
+    "ms_ssim": lambda pm, a, b: pm.calculate_ms_ssim(a, b),
+    "ms_ssim_batch": lambda pm, a, b: pm.calculate_ms_ssim_batch(a, b),
+    "ms_ssim_batch_streaming": lambda pm, a, b: pm.calculate_ms_ssim_batch_streaming(a, b, band_rows=128),
+    "feature_similarity": lambda pm, a, b: pm.calculate_feature_similarity(a, b),
+    "feature_similarity_batch": lambda pm, a, b: pm.calculate_feature_similarity_batch(a, b),
+    "perceptual_loss": lambda pm, a, b: pm.calculate_perceptual_loss(a, b),
+    "content_loss": lambda pm, a, b: pm.calculate_content_loss(a, b),
+    "style_loss": lambda pm, a, b: pm.calculate_style_loss(a, b),
+    "vgg_losses_batch": lambda pm, a, b: pm.calculate_vgg_losses_batch(a, b),
+    "vgg_losses_tiled": lambda pm, a, b: pm.calculate_vgg_losses_tiled(a, b, tile_size=256),
+    "batch_metrics": lambda pm, a, b: pm.calculate_batch_metrics(a, b),
+    "batch_metrics_capped": lambda pm, a, b: pm.calculate_batch_metrics(a, b, max_memory_mb=512),
+}
+
+
+class PeakRSSSampler:
+    # Polls the resident set size on a background thread; torch's CPU allocations are
+    # invisible to tracemalloc, so sampling RSS is the portable way to get a per-case peak.
+    def __init__(self, read_rss, interval=0.005):
+        self.read_rss = read_rss
+        self.interval = interval
+        self.baseline = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.baseline = self.peak = self.read_rss()
+        if self.baseline is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.read_rss())
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.peak = max(self.peak, self.read_rss())
+
+    @property
+    def peak_mb(self):
+        return None if self.baseline is None else (self.peak - self.baseline) / 1024**2
+
+
+def synthetic_pair(size, batch_size, seed=0):
+    # Reference plus a noisy "generated" copy, so the metrics see realistic, non-trivial inputs
+    generator = torch.Generator().manual_seed(seed)
+    reference = torch.rand(batch_size, size, size, 3, generator=generator)
+    noise = 0.1 * torch.randn(batch_size, size, size, 3, generator=generator)
+    return reference, (reference + noise).clamp(0, 1)
+
+
+def sample_pair(pairs, size, batch_size):
+    # Cycles through the sample pairs to fill the batch, every image resized to size x size
+    originals, generated = [], []
+    for index in range(batch_size):
+        _, original_path, generated_path = pairs[index % len(pairs)]
+        originals.append(load_image(original_path, size=(size, size)))
+        generated.append(load_image(generated_path, size=(size, size)))
+    return torch.cat(originals), torch.cat(generated)
+
+
+def run_case(perf_measure, benchmark, image1, image2, warmup, repeats, read_rss):
+    with torch.inference_mode():
+        for _ in range(warmup):  # Model loading, compilation and allocator warm-up
+            benchmark(perf_measure, image1, image2)
+        latencies = []
+        with PeakRSSSampler(read_rss) as sampler:
+            for _ in range(repeats):
+                start = time.perf_counter()
+                benchmark(perf_measure, image1, image2)
+                latencies.append(time.perf_counter() - start)
+    latencies = np.asarray(latencies)
+    return {
+        "repeats": repeats,
+        "mean_s": float(latencies.mean()),
+        "p50_s": float(np.percentile(latencies, 50)),
+        "p90_s": float(np.percentile(latencies, 90)),
+        "p95_s": float(np.percentile(latencies, 95)),
+        "p99_s": float(np.percentile(latencies, 99)),
+        "throughput_pairs_s": float(image2.shape[0] / latencies.mean()),
+        "peak_rss_mb": sampler.peak_mb,
+    }
+
+
+def compare(results, baseline, threshold, metric="p50_s"):
+    regressions = []
+    print(f"\nComparison against baseline ({metric}, threshold {threshold:.0%}):")
+    for key, result in results.items():
+        reference = baseline.get("results", {}).get(key)
+        if reference is None or "error" in result or "error" in reference:
+            continue
+        change = result[metric] / reference[metric] - 1
+        flag = "REGRESSION" if change > threshold else ("improved" if change < -threshold else "")
+        print(f"    {key:<52} {reference[metric]:>9.4f} -> {result[metric]:>9.4f} s  {change:>+8.1%}  {flag}")
+        if change > threshold:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency, throughput and memory benchmark for PerformanceMeasurement.")
+    parser.add_argument("--samples-dir", default=SAMPLE_OUTPUTS_DIR)
+    parser.add_argument("--sources", nargs="+", choices=("synthetic", "samples"), default=["synthetic", "samples"])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[512, 768, 1024, 2048])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--methods", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--inference-backend", default="fp32")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--save-baseline", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown (default 10%%)")
+    args = parser.parse_args()
+
+    node_module = import_performance_node()
+    perf_measure = node_module.PerformanceMeasurement(inference_backend=args.inference_backend, device=args.device)
+
+    pairs = list(find_sample_pairs(args.samples_dir)) if "samples" in args.sources else []
+    if "samples" in args.sources and not pairs:
+        print(f"No original/generated pairs found under {args.samples_dir}; benchmarking synthetic images only")
+
+    results = {}
+    for source in args.sources:
+        if source == "samples" and not pairs:
+            continue
+        for size in args.sizes:
+            for batch_size in args.batch_sizes:
+                if source == "synthetic":
+                    image1, image2 = synthetic_pair(size, batch_size)
+                else:
+                    image1, image2 = sample_pair(pairs, size, batch_size)
+                for method in args.methods:
+                    key = f"{source}/{method}/{size}px/b{batch_size}"
+                    try:
+                        result = run_case(perf_measure, BENCHMARKS[method], image1, image2, args.warmup, args.repeats,
+                                          node_module._current_rss_bytes)
+                    except Exception as e:  # Typically out of memory at the largest sizes; recorded, not fatal
+                        results[key] = {"error": f"{type(e).__name__}: {(str(e).splitlines() or [''])[0]}"}
+                        print(f"{key:<52} skipped: {results[key]['error']}")
+                        continue
+                    results[key] = result
+                    peak = "N/A" if result["peak_rss_mb"] is None else f"{result['peak_rss_mb']:.1f} MB"
+                    print(f"{key:<52} p50 {result['p50_s']:.4f}  p95 {result['p95_s']:.4f}  p99 {result['p99_s']:.4f} s"
+                          f"  {result['throughput_pairs_s']:.2f} pairs/s  peak RSS +{peak}")
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "threads": torch.get_num_threads(),
+            "device": args.device,
+            "inference_backend": args.inference_backend,
+        },
+        "results": results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to: {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} benchmark(s) regressed beyond {args.threshold:.0%}")
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Calibration report for the metric inference backends.
+
+Scores every sample_outputs pair with each inference backend and reports how far
+each metric drifts from the fp32 eager baseline, together with the latency change.
+
+    python calibrate_inference_backends.py --device cpu --backends fp32 bf16 channels_last
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from evaluation_utils import SAMPLE_OUTPUTS_DIR, find_sample_pairs, import_performance_node, load_pair
+
+
+def score_backend(node_module, backend, pairs, device, repeats):
+    perf_measure = node_module.PerformanceMeasurement(inference_backend=backend, device=device)
+    scores, latencies = [], []
+    for index, (_, original, generated) in enumerate(pairs):
+        if index == 0:
+            perf_measure.calculate_batch_metrics(original, generated)  # Warm-up (model load, compile)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            metrics = perf_measure.calculate_batch_metrics(original, generated)
+            latencies.append(time.perf_counter() - start)
+        scores.append({name: values[0] for name, values in metrics.items()})
+    return scores, latencies
+
+
+def drift_report(baseline_scores, scores):
+    report = {}
+    for name in baseline_scores[0]:
+        base = np.array([score[name] for score in baseline_scores])
+        value = np.array([score[name] for score in scores])
+        diff = np.abs(value - base)
+        report[name] = {
+            "mean_abs_drift": float(diff.mean()),
+            "max_abs_drift": float(diff.max()),
+            "max_rel_drift": float((diff / np.maximum(np.abs(base), 1e-12)).max()),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metric drift of each inference backend against fp32.")
+    parser.add_argument("--samples-dir", default=SAMPLE_OUTPUTS_DIR)
+    parser.add_argument("--backends", nargs="+", default=None, help="Backends to compare (default: all)")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Optional JSON file for the full report")
+    args = parser.parse_args()
+
+    node_module = import_performance_node()
+    backends = args.backends or list(node_module.INFERENCE_BACKENDS)
+    if "fp32" not in backends:
+        backends.insert(0, "fp32")
+
+    pairs = [(name, *load_pair(original, generated))
+             for name, original, generated in find_sample_pairs(args.samples_dir)]
+    if not pairs:
+        raise SystemExit(f"No original/generated pairs found under {args.samples_dir}")
+    print(f"Calibrating {len(backends)} backends on {len(pairs)} pairs ({args.device})")
+
+    results = {}
+    for backend in backends:
+        try:
+            results[backend] = score_backend(node_module, backend, pairs, args.device, args.repeats)
+        except Exception as e:
+            print(f"{backend}: skipped ({e})")
+
+    baseline_scores, baseline_latencies = results["fp32"]
+    baseline_latency = float(np.mean(baseline_latencies))
+    report = {}
+    for backend, (scores, latencies) in results.items():
+        latency = float(np.mean(latencies))
+        report[backend] = {
+            "mean_latency_s": latency,
+            "speedup": baseline_latency / latency,
+            "metrics": drift_report(baseline_scores, scores),
+        }
+        print(f"\n{backend}: {latency:.3f} s/pair ({baseline_latency / latency:.2f}x vs fp32)")
+        for name, drift in report[backend]["metrics"].items():
+            print(f"    {name:<20} mean |d| {drift['mean_abs_drift']:.2e}  max |d| {drift['max_abs_drift']:.2e}"
+                  f"  max rel {drift['max_rel_drift']:.2%}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nCalibration report saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
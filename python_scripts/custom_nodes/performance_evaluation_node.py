@@ -1,116 +1,1343 @@
 import time
 import os
+import hashlib
+import threading
+import contextlib
+import atexit
+import queue
+import uuid
+import json
+import glob
+import sys
+import platform
+import tracemalloc
+from collections import OrderedDict
 from datetime import datetime
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torchvision.transforms as transforms
 from torchvision.models import inception_v3, Inception_V3_Weights, vgg19
 import numpy as np
-from skimage.metrics import structural_similarity as ssim
 import traceback
 
-class PerformanceMeasurement:
+VGG_CONTENT_LAYER = 22  # relu4_4
+VGG_STYLE_LAYERS = (0, 5, 10, 19, 28)  # Conv layers
+VGG_TRUNK_DEPTH = max(VGG_CONTENT_LAYER, *VGG_STYLE_LAYERS)  # Deepest layer content and style losses read
+VGG_LAST_LAYER = 36  # Final max-pool of vgg19.features; the perceptual loss needs the full trunk
+
+PERFORMANCE_LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "performance")
+FEATURE_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "performance_cache")
+INCEPTION_STATISTICS_PATH = os.path.join(PERFORMANCE_LOG_DIR, "inception_statistics.npz")
+PROFILER_TRACE_DIR = os.path.join(PERFORMANCE_LOG_DIR, "traces")
+CPU_THREAD_PROFILE_PATH = os.path.join(PERFORMANCE_LOG_DIR, "cpu_thread_profile.json")
+# Local weight store written by export_metric_weights.py; when present no torchvision download is needed
+METRIC_WEIGHTS_DIR = os.environ.get("PERFORMANCE_METRIC_WEIGHTS_DIR",
+                                    os.path.join(os.path.dirname(os.path.dirname(__file__)), "metric_weights"))
+VGG_WEIGHTS_FILE = "vgg19_features.pt"
+INCEPTION_WEIGHTS_FILE = "inception_v3_features.pt"
+
+
+def gram_matrix(x):
+    # Per-item Gram matrices: (B, C, H, W) -> (B, C, C)
+    b, c, h, w = x.size()
+    features = x.reshape(b, c, h * w)
+    gram = torch.bmm(features, features.transpose(1, 2))
+    return gram.div(c * h * w)
+
+
+def batch_mse(x1, x2):
+    # Per-item MSE; a batch of one broadcasts against a larger batch
+    return (x1 - x2).pow(2).flatten(1).mean(1)
+
+
+MS_SSIM_WEIGHTS = (0.0448, 0.2856, 0.3001, 0.2363, 0.1333)
+
+
+def _ssim_kernel(window, win_size, sigma, channels, device, dtype):
+    if window == "gaussian":
+        radius = int(3.5 * sigma + 0.5)  # skimage/scipy truncate=3.5
+        coords = torch.arange(-radius, radius + 1, device=device, dtype=dtype)
+        gauss = torch.exp(-coords.pow(2) / (2 * sigma ** 2))
+        gauss = gauss / gauss.sum()
+        kernel = gauss[:, None] * gauss[None, :]
+    elif window == "uniform":
+        kernel = torch.full((win_size, win_size), 1.0 / win_size ** 2, device=device, dtype=dtype)
+    else:
+        raise ValueError(f"Unknown SSIM window: {window}")
+    return kernel.expand(channels, 1, *kernel.shape).contiguous()
+
+
+def _ssim_maps(x, y, kernel, data_range, sample_covariance):
+    # Valid (unpadded) filtering is exactly skimage's filter-then-crop
+    channels = x.shape[1]
+    filt = lambda t: F.conv2d(t, kernel, groups=channels)
+    n = kernel.shape[-1] * kernel.shape[-2]
+    cov_norm = n / (n - 1) if sample_covariance else 1.0
+    ux, uy = filt(x), filt(y)
+    vx = cov_norm * (filt(x * x) - ux * ux)
+    vy = cov_norm * (filt(y * y) - uy * uy)
+    vxy = cov_norm * (filt(x * y) - ux * uy)
+    c1 = (0.01 * data_range) ** 2
+    c2 = (0.03 * data_range) ** 2
+    cs_map = (2 * vxy + c2) / (vx + vy + c2)
+    ssim_map = (2 * ux * uy + c1) / (ux * ux + uy * uy + c1) * cs_map
+    return ssim_map, cs_map
+
+
+def _ssim_per_item(x, y, kernel, data_range, sample_covariance):
+    ssim_map, cs_map = _ssim_maps(x, y, kernel, data_range, sample_covariance)
+    return ssim_map.flatten(1).mean(1), cs_map.flatten(1).mean(1)
+
+
+def _broadcast_batch(x, y):
+    if x.shape[0] != y.shape[0]:
+        if x.shape[0] == 1:
+            x = x.expand(y.shape[0], *x.shape[1:])
+        elif y.shape[0] == 1:
+            y = y.expand(x.shape[0], *y.shape[1:])
+        else:
+            raise ValueError(f"Batch sizes do not match: {x.shape[0]} vs {y.shape[0]}")
+    return x, y
+
+
+def structural_similarity(x, y, data_range=1.0, window="uniform", win_size=7, sigma=1.5):
+    """Per-item SSIM of two (B, C, H, W) tensors, computed on their device.
+
+    window="uniform" reproduces skimage.metrics.structural_similarity with its defaults
+    (7x7 box filter, sample covariance); window="gaussian" reproduces it with
+    gaussian_weights=True, sigma=1.5, use_sample_covariance=False. Both agree with
+    skimage to within 1e-4 absolute in float32 (1e-8 in float64), as does
+    calculate_ssim_batch_streaming; python_scripts/verify_metric_accuracy.py checks this.
+    """
+    x, y = _broadcast_batch(x, y)
+    kernel = _ssim_kernel(window, win_size, sigma, x.shape[1], x.device, x.dtype)
+    if min(x.shape[-2:]) < kernel.shape[-1]:
+        raise ValueError(f"Image of size {tuple(x.shape[-2:])} is smaller than the {kernel.shape[-1]}px SSIM window")
+    return _ssim_per_item(x, y, kernel, data_range, sample_covariance=(window == "uniform"))[0]
+
+
+def ms_ssim(x, y, data_range=1.0, weights=MS_SSIM_WEIGHTS, sigma=1.5):
+    """Per-item multi-scale SSIM (Wang et al. 2003) with an 11x11 Gaussian window.
+
+    Images too small for all five scales use as many scales as fit, with the
+    weights renormalized.
+    """
+    kernel = _ssim_kernel("gaussian", None, sigma, x.shape[1], x.device, x.dtype)
+    scales = _ms_ssim_scales(x.shape[-2:], kernel.shape[-1], len(weights))
+    return _combine_ms_ssim(_ms_ssim_factors(x, y, kernel, data_range, scales), weights)
+
+
+def _ms_ssim_scales(size, win, max_scales):
+    if min(size) < win:
+        raise ValueError(f"Image of size {tuple(size)} is smaller than the {win}px MS-SSIM window")
+    scales = 1
+    while scales < max_scales and min(size) // 2 ** scales >= win:
+        scales += 1
+    return scales
+
+
+def _ms_ssim_factors(x, y, kernel, data_range, scales):
+    # Contrast-structure terms of every scale but the last, then the last scale's full SSIM
+    x, y = _broadcast_batch(x, y)
+    factors = []
+    for scale in range(scales):
+        ssim_value, cs_value = _ssim_per_item(x, y, kernel, data_range, sample_covariance=False)
+        factors.append(ssim_value if scale == scales - 1 else cs_value)
+        if scale < scales - 1:
+            x = F.avg_pool2d(x, kernel_size=2)
+            y = F.avg_pool2d(y, kernel_size=2)
+    return factors
+
+
+def _combine_ms_ssim(factors, weights):
+    factors = torch.stack(factors, dim=1).clamp(min=0)
+    weights = torch.tensor(weights[:factors.shape[1]], device=factors.device, dtype=factors.dtype)
+    return factors.pow(weights / weights.sum()).prod(dim=1)
+
+
+def _tensor_nbytes(value):
+    if torch.is_tensor(value):
+        return value.element_size() * value.nelement()
+    if isinstance(value, dict):
+        return sum(_tensor_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_tensor_nbytes(v) for v in value)
+    return 0
+
+
+def _move_tensors(value, device):
+    if torch.is_tensor(value):
+        return value.to(device)
+    if isinstance(value, dict):
+        return {k: _move_tensors(v, device) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_move_tensors(v, device) for v in value]
+    return value
+
+
+class FeatureCache:
+    """Content-addressed cache of deep features, keyed by image hash and metric configuration.
+
+    Entries live in an in-memory LRU bounded by ``max_bytes``; with ``use_disk`` they are
+    also written under ``cache_dir`` so later ComfyUI sessions can reuse them.
+    """
+
+    def __init__(self, max_bytes=256 * 1024**2, cache_dir=FEATURE_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.current_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(image, config):
+        tensor = image.detach().cpu().contiguous()
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{tuple(tensor.shape)}|{tensor.dtype}|{config}".encode())
+        digest.update(tensor.numpy().tobytes())
+        return digest.hexdigest()
+
+    def get_or_compute(self, image, config, compute, device="cpu", use_disk=False):
+        key = self.make_key(image, config)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+        path = os.path.join(self.cache_dir, f"{key}.pt") if use_disk and self.cache_dir else None
+        if path and os.path.exists(path):
+            try:
+                value = _move_tensors(torch.load(path, map_location="cpu"), device)
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                self._put(key, value)
+                return value
+            except Exception as e:
+                print(f"Ignoring unreadable feature cache entry {path}: {e}")
+
+        value = compute()
+        with self._lock:
+            self.misses += 1
+        self._put(key, value)
+        if path:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            torch.save(_move_tensors(value, "cpu"), tmp_path)
+            os.replace(tmp_path, path)
+        return value
+
+    def _put(self, key, value):
+        size = _tensor_nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "entries": len(self._entries), "memory_mb": self.current_bytes / 1024**2}
+
+    def stats_string(self):
+        return (f"Feature Cache: {self.hits} hits ({self.disk_hits} from disk), {self.misses} misses, "
+                f"{len(self._entries)} entries, {self.current_bytes / 1024**2:.2f} MB in memory\n")
+
+
+# Shared by every End node in the process
+FEATURE_CACHE = FeatureCache()
+
+
+# Inference backends for the metric networks; "+" combines options
+INFERENCE_BACKENDS = ("fp32", "channels_last", "bf16", "channels_last+bf16", "compile")
+_BACKEND_OPTIONS = {"channels_last", "bf16", "compile"}
+
+
+def backend_flags(backend):
+    flags = set(backend.split("+")) - {"fp32"}
+    unknown = flags - _BACKEND_OPTIONS
+    if unknown:
+        raise ValueError(f"Unknown inference backend option(s): {', '.join(sorted(unknown))}")
+    return flags
+
+
+def prepare_model(model, backend, compile_model=True):
+    flags = backend_flags(backend)
+    if "channels_last" in flags:
+        model = model.to(memory_format=torch.channels_last)
+    if "compile" in flags and compile_model:
+        model = torch.compile(model)
+    return model
+
+
+def load_local_weights(filename):
+    # Memory-mapped: weight pages come from the OS page cache and are shared by every
+    # process on the host; only the pages of layers actually built are ever read.
+    path = os.path.join(METRIC_WEIGHTS_DIR, filename)
+    if not os.path.exists(path):
+        return None
+    return torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+
+
+def load_inception(device):
+    state = load_local_weights(INCEPTION_WEIGHTS_FILE)
+    if state is None:
+        weights = Inception_V3_Weights.DEFAULT
+        model = inception_v3(weights=weights)
+    else:
+        # Same configuration as the pretrained weights, minus the auxiliary classifier
+        with torch.device("meta"):
+            model = inception_v3(weights=None, aux_logits=False, transform_input=True, init_weights=False)
+    model.fc = nn.Identity()  # Remove the final fully connected layer
+    if state is not None:
+        model.load_state_dict(state, assign=True)  # assign keeps the memory-mapped tensors
+    return model.eval().to(device)
+
+
+def load_vgg(device, depth=VGG_LAST_LAYER):
+    state = load_local_weights(VGG_WEIGHTS_FILE)
+    if state is None:
+        model = vgg19(pretrained=True).features[:depth + 1]
+    else:
+        with torch.device("meta"):
+            model = vgg19().features[:depth + 1]
+        # Slicing keeps the original layer names, so the stored keys line up
+        model.load_state_dict({key: value for key, value in state.items() if int(key.split(".")[0]) <= depth},
+                              assign=True)
+    # Activations are captured mid-network, so the following ReLU must not overwrite them
+    for layer in model:
+        if isinstance(layer, nn.ReLU):
+            layer.inplace = False
+    return model.eval().to(device)
+
+
+class ModelRegistry:
+    """Process-wide registry that loads each metric network on first use and shares it."""
+
     def __init__(self):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.inception = self._load_inception()
-        self.vgg = self._load_vgg()
+        self._loaders = {}
+        self._models = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, compile_model=True):
+        # compile_model=False for networks that are run layer segment by segment
+        self._loaders[name] = (loader, compile_model)
+
+    def get(self, name, device, backend="fp32"):
+        key = (name, str(device), backend)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        # Per-model lock: loading VGG does not block a concurrent Inception load
+        with lock:
+            if key not in self._models:
+                print(f"Loading metric model '{name}' on {device} ({backend})...")
+                loader, compile_model = self._loaders[name]
+                self._models[key] = prepare_model(loader(device), backend, compile_model)
+            return self._models[key]
+
+    def loaded(self):
+        return sorted({name for name, _, _ in self._models})
+
+    def release(self, name=None):
+        with self._lock:
+            for key in [k for k in self._models if name is None or k[0] == name]:
+                del self._models[key]
+
+
+MODEL_REGISTRY = ModelRegistry()
+MODEL_REGISTRY.register("inception_v3", load_inception)
+MODEL_REGISTRY.register("vgg19", load_vgg, compile_model=False)
+# Layers 0..28 only: enough for the content and style losses
+MODEL_REGISTRY.register("vgg19_trunk", lambda device: load_vgg(device, VGG_TRUNK_DEPTH), compile_model=False)
+
+# Networks each metric needs; SSIM runs without any model
+METRIC_MODELS = {
+    "ssim": (),
+    "ms_ssim": (),
+    "feature_similarity": ("inception_v3",),
+    "perceptual_loss": ("vgg19",),
+    "content_loss": ("vgg19_trunk",),
+    "style_loss": ("vgg19_trunk",),
+}
+ALL_METRICS = tuple(METRIC_MODELS)
+VGG_METRICS = tuple(name for name, models in METRIC_MODELS.items() if any(m.startswith("vgg19") for m in models))
+
+
+def metric_models(metrics):
+    # Networks the given metrics need; the full VGG also serves the trunk's layers, so only one is loaded
+    models = {model for name in metrics for model in METRIC_MODELS[name]}
+    if "vgg19" in models:
+        models.discard("vgg19_trunk")
+    return sorted(models)
+# Implementation version of each metric; bump when a change alters its values so stored scores get recomputed
+METRIC_VERSIONS = dict.fromkeys(ALL_METRICS, 1)
+
+# eval_resolution caps the longest image side before scoring (None keeps full resolution)
+METRIC_PROFILES = {
+    "full": {"metrics": ALL_METRICS, "eval_resolution": None},
+    "standard": {"metrics": ("ssim", "feature_similarity"), "eval_resolution": None},
+    "fast": {"metrics": ("ssim",), "eval_resolution": 256},
+}
+
+
+def resolve_metric_profile(profile, toggles=None, eval_resolution=0):
+    # Per-metric toggles ("on" / "off") override the profile; "profile" keeps its choice
+    settings = METRIC_PROFILES[profile]
+    toggles = toggles or {}
+    metrics = tuple(name for name in ALL_METRICS
+                    if toggles.get(name) == "on" or (name in settings["metrics"] and toggles.get(name) != "off"))
+    return metrics, eval_resolution or settings["eval_resolution"]
+
+
+def downscale_image(image, max_side):
+    # (B, H, W, C) -> same layout with the longest side capped at max_side
+    if image.dim() == 3:
+        image = image.unsqueeze(0)
+    height, width = image.shape[1:3]
+    if not max_side or max(height, width) <= max_side:
+        return image
+    scale = max_side / max(height, width)
+    size = (max(7, round(height * scale)), max(7, round(width * scale)))  # SSIM needs a 7x7 window
+    resized = F.interpolate(image.permute(0, 3, 1, 2).float(), size=size, mode="area")
+    return resized.permute(0, 2, 3, 1)
+
+
+# VGG layer segments per (model, capture points, compiled), shared by all PerformanceMeasurement instances
+_VGG_SEGMENTS = {}
+
+VGG_TILE_ALIGN = 32  # Total pooling stride of VGG19 features; tiles must stay on this grid
+VGG_TILED_RTOL = 0.05  # Relative error bound of tiled against untiled VGG losses (256px+ tiles)
+VGG_MIN_TILE = 256  # Smallest tile the bound above is validated for
+
+
+def vgg_tile_size_for_memory(max_bytes, batch_size, overlap):
+    # Largest aligned tile whose first-block activations fit (64 channels, fp32, ~3 live tensors),
+    # but never below VGG_MIN_TILE so the losses stay within VGG_TILED_RTOL. The smallest cap that
+    # is honoured is therefore (256 + 2 * overlap)^2 * 768 bytes per image in the batch: about
+    # 108 MB per image at the default 64px overlap, 216 MB for one reference/output pair.
+    bytes_per_pixel = batch_size * 64 * 4 * 3
+    side = int((max_bytes / bytes_per_pixel) ** 0.5) - 2 * overlap
+    return max(VGG_MIN_TILE, side // VGG_TILE_ALIGN * VGG_TILE_ALIGN)
+
+
+def ssim_band_rows_for_memory(max_bytes, batch_size, width):
+    # Rows per SSIM band: 3 channels, fp32, ~12 live filtered maps
+    return max(1, int(max_bytes // (batch_size * 3 * 4 * 12 * width)))
+
+
+def cpu_host_fingerprint():
+    # A thread profile is only valid on the kind of host it was tuned on
+    return {"cpu_count": os.cpu_count(), "machine": platform.machine(), "torch": torch.__version__.split("+")[0]}
+
+
+def apply_cpu_thread_profile(path=CPU_THREAD_PROFILE_PATH):
+    """Apply the thread settings chosen by tune_cpu_threads.py and return what is in effect.
+
+    Missing, unreadable or foreign-host profiles, or path=None, leave torch's defaults
+    untouched. The inter-op pool can only be sized before torch first uses it, so that
+    setting may be reported as not applied when ComfyUI has already run work.
+    """
+    settings = {"source": "torch defaults", "intra_op_threads": torch.get_num_threads(),
+                "inter_op_threads": torch.get_num_interop_threads(), "ssim_band_rows": None}
+    if path is None:
+        settings["source"] = "torch defaults (profile disabled)"
+        return settings
+    if not os.path.exists(path):
+        return settings
+    try:
+        with open(path) as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable CPU thread profile {path}: {e}")
+        return settings
+    if profile.get("host") != cpu_host_fingerprint():
+        print(f"Ignoring CPU thread profile {path}: tuned on a different host ({profile.get('host')})")
+        settings["source"] = "torch defaults (profile is for another host)"
+        return settings
+
+    torch.set_num_threads(profile["intra_op_threads"])
+    try:
+        torch.set_num_interop_threads(profile["inter_op_threads"])
+    except RuntimeError:
+        settings["inter_op_note"] = "inter-op pool already started; profile value not applied"
+    settings.update(source=path, intra_op_threads=torch.get_num_threads(),
+                    inter_op_threads=torch.get_num_interop_threads(), ssim_band_rows=profile.get("ssim_band_rows"))
+    return settings
+
+
+# Applied once when ComfyUI loads the nodes. The standalone scripts set
+# PERFORMANCE_CPU_THREAD_PROFILE=off before importing, so they keep their own thread settings.
+CPU_THREAD_SETTINGS = apply_cpu_thread_profile(
+    None if os.environ.get("PERFORMANCE_CPU_THREAD_PROFILE") == "off" else CPU_THREAD_PROFILE_PATH)
+
+
+class PreparedImage:
+    """An image batch prepared once and shared by every metric of a run.
+
+    Each view is built on first use and then reused: ``float()`` is the (B, 3, H, W)
+    tensor on the metric device, ``normalized()`` its ImageNet-normalized form,
+    ``inception_input()`` the normalized 299x299 Inception input and ``numpy()`` a
+    (B, H, W, 3) float32 array. ``image`` keeps the raw tensor for the streaming and
+    tiled paths, which slice it instead of materializing the full-size views.
+    """
+
+    def __init__(self, image, measurement):
+        self.image = image.unsqueeze(0) if image.dim() == 3 else image
+        self.measurement = measurement
+        self._views = {}
+
+    def _view(self, name, build):
+        if name not in self._views:
+            self._views[name] = build()
+        return self._views[name]
+
+    def float(self):
+        return self._view("float", lambda: self.measurement.preprocess_image(self.image))
+
+    def normalized(self):
+        return self._view("normalized", lambda: self.measurement.normalize_image(self.float()))
+
+    def inception_input(self):
+        return self._view("inception", self._build_inception_input)
+
+    def _build_inception_input(self):
+        # Without a full-size float view (memory-capped runs) the raw tensor is resized first, so
+        # only the 299x299 input is converted and moved to the device; resizing is linear, so the
+        # input is the same either way
+        resize = lambda image: F.interpolate(image, size=(299, 299), mode='bilinear', align_corners=False)
+        if "float" in self._views:
+            image = resize(self.float())
+        else:
+            image = self.measurement.preprocess_image(resize(self.image.permute(0, 3, 1, 2).float()))
+        return self.measurement.normalize_image(image)
+
+    def numpy(self):
+        return self._view("numpy", lambda: self.float().permute(0, 2, 3, 1).cpu().numpy())
+
+    def release(self):
+        self._views.clear()
+
+
+def raw_image(image):
+    # The (B, H, W, C) tensor behind a PreparedImage, or the tensor itself
+    image = image.image if isinstance(image, PreparedImage) else image
+    return image.unsqueeze(0) if image.dim() == 3 else image
+
+
+@contextlib.contextmanager
+def timed_phase(timings, name, device):
+    # Records {"wall_s", "cpu_s", memory} for the enclosed block into timings[name]; no-op without a dict.
+    # CUDA work is synchronized so asynchronous kernels are billed to the phase that launched them.
+    if timings is None:
+        yield
+        return
+    cuda = device.type == "cuda"
+    if cuda:
+        torch.cuda.synchronize(device)
+        torch.cuda.reset_peak_memory_stats(device)
+        base_memory = torch.cuda.memory_allocated(device)
+    rss = _current_rss_bytes()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        if cuda:
+            torch.cuda.synchronize(device)
+        timing = {"wall_s": time.perf_counter() - wall, "cpu_s": time.process_time() - cpu}
+        if cuda:
+            timing["peak_memory_mb"] = (torch.cuda.max_memory_allocated(device) - base_memory) / 1024**2
+        else:
+            end_rss = _current_rss_bytes()
+            timing["rss_change_mb"] = None if rss is None or end_rss is None else (end_rss - rss) / 1024**2
+        timings[name] = timing
+
+
+class PerformanceMeasurement:
+    def __init__(self, feature_cache=None, feature_cache_disk=False, model_registry=MODEL_REGISTRY,
+                 inference_backend="fp32", device=None):
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = torch.device(device)
+        self.model_registry = model_registry
+        self.inference_backend = inference_backend
         self.normalize = transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
         self.mse_loss = nn.MSELoss()
+        self.feature_cache = feature_cache
+        self.feature_cache_disk = feature_cache_disk
+        # Tuned SSIM band height for CPU scoring (streaming SSIM is exact, so this only affects speed)
+        self.ssim_band_rows = CPU_THREAD_SETTINGS["ssim_band_rows"] if self.device.type == "cpu" else None
 
-    def _load_inception(self):
-        weights = Inception_V3_Weights.DEFAULT
-        model = inception_v3(weights=weights)
-        model.fc = nn.Identity()  # Remove the final fully connected layer
-        return model.eval().to(self.device)
+    # Models are resolved lazily through the shared registry
+    @property
+    def inception(self):
+        return self.model_registry.get("inception_v3", self.device, self.inference_backend)
+
+    @property
+    def vgg(self):
+        return self.model_registry.get("vgg19", self.device, self.inference_backend)
+
+    def vgg_for(self, last_layer):
+        # The truncated trunk when it reaches last_layer, so the content and style losses never load the rest
+        name = "vgg19_trunk" if last_layer <= VGG_TRUNK_DEPTH else "vgg19"
+        return self.model_registry.get(name, self.device, self.inference_backend)
+
+    def inference_context(self):
+        stack = contextlib.ExitStack()
+        stack.enter_context(torch.inference_mode())
+        if "bf16" in backend_flags(self.inference_backend):
+            stack.enter_context(torch.autocast(device_type=self.device.type, dtype=torch.bfloat16))
+        return stack
 
-    def _load_vgg(self):
-        model = vgg19(pretrained=True).features
-        return model.eval().to(self.device)
+    def _network_input(self, image):
+        if "channels_last" in backend_flags(self.inference_backend):
+            image = image.contiguous(memory_format=torch.channels_last)
+        return image
+
+    def _vgg_segments_for(self, boundaries):
+        # VGG split at the capture points; segments are compiled once per split when requested
+        vgg = self.vgg_for(boundaries[-1])
+        compiled = "compile" in backend_flags(self.inference_backend)
+        key = (id(vgg), boundaries, compiled)
+        segments = _VGG_SEGMENTS.get(key)
+        if segments is None:
+            starts = (0,) + tuple(end + 1 for end in boundaries[:-1])
+            segments = [vgg[start:end + 1] for start, end in zip(starts, boundaries)]
+            if compiled:
+                segments = [torch.compile(segment) for segment in segments]
+            _VGG_SEGMENTS[key] = segments
+        return segments
 
     def preprocess_image(self, image):
-        if image.dim() == 4:  # (B, H, W, C)
-            image = image.squeeze(0)  # Remove batch dimension
-        if image.shape[-1] == 3:  # (H, W, 3)
-            image = image.permute(2, 0, 1)  # Change to (3, H, W)
-        elif image.shape[0] != 3:
+        if image.dim() == 3:  # (H, W, C)
+            image = image.unsqueeze(0)  # Add batch dimension
+        if image.dim() != 4:
+            raise ValueError(f"Unexpected image shape: {image.shape}. Expected (B, H, W, C).")
+        if image.shape[-1] == 3:  # (B, H, W, 3)
+            image = image.permute(0, 3, 1, 2)  # Change to (B, 3, H, W)
+        elif image.shape[1] != 3:
             raise ValueError(f"Unexpected image shape: {image.shape}. Expected 3 channels.")
-        
+
         image = image.float() / 255.0  # Normalize to [0, 1]
-        image = image.unsqueeze(0)  # Add batch dimension
         return image.to(self.device)
 
     def normalize_image(self, image):
         return self.normalize(image)
 
+    def prepare(self, image):
+        # Every metric accepts raw IMAGE tensors or PreparedImage; preparing once lets them share views
+        return image if isinstance(image, PreparedImage) else PreparedImage(image, self)
+
+    def calculate_ssim_batch(self, image1, image2, window="uniform"):
+        # Torch SSIM on the metric device; the default window matches the previous skimage numbers
+        img1 = self.prepare(image1).float()
+        img2 = self.prepare(image2).float()
+        return structural_similarity(img1, img2, data_range=1.0, window=window).cpu()
+
+    def calculate_ssim_batch_streaming(self, image1, image2, band_rows=256, window="uniform"):
+        # SSIM over horizontal bands: only band_rows (+ window halo) rows are ever on the device.
+        # Each band yields exactly the matching rows of the full SSIM map, so the result is exact.
+        image1, image2 = raw_image(image1), raw_image(image2)
+        kernel = _ssim_kernel(window, 7, 1.5, 3, self.device, torch.float32)
+        win = kernel.shape[-1]
+        height = image1.shape[1]
+        if height < win:
+            raise ValueError(f"Image height {height} is smaller than the {win}px SSIM window")
+        total, count = 0, 0
+        for start in range(0, height - win + 1, band_rows):
+            stop = min(start + band_rows, height - win + 1) + win - 1
+            x, y = _broadcast_batch(self.preprocess_image(image1[:, start:stop]),
+                                    self.preprocess_image(image2[:, start:stop]))
+            ssim_map, _ = _ssim_maps(x, y, kernel, 1.0, sample_covariance=(window == "uniform"))
+            total = total + ssim_map.flatten(1).sum(1)
+            count += ssim_map[0].numel()
+        return (total / count).cpu()
+
+    def calculate_ms_ssim_batch(self, image1, image2):
+        return ms_ssim(self.prepare(image1).float(), self.prepare(image2).float(), data_range=1.0).cpu()
+
+    def calculate_ms_ssim_batch_streaming(self, image1, image2, band_rows=256):
+        # MS-SSIM without the full-size float tensors: the finest scale's contrast-structure term
+        # is accumulated over row bands like streaming SSIM, while the images are average-pooled
+        # band by band into the next scale. The coarser scales hold a quarter of the pixels and
+        # run in memory. Pooling within even-row bands equals pooling the whole image, so the
+        # result matches calculate_ms_ssim_batch.
+        image1, image2 = raw_image(image1), raw_image(image2)
+        kernel = _ssim_kernel("gaussian", None, 1.5, 3, self.device, torch.float32)
+        win = kernel.shape[-1]
+        height = image1.shape[1]
+        scales = _ms_ssim_scales(image1.shape[1:3], win, len(MS_SSIM_WEIGHTS))
+        if scales == 1:
+            return self.calculate_ssim_batch_streaming(image1, image2, band_rows, window="gaussian").clamp(min=0)
+
+        total, count = 0, 0
+        for start in range(0, height - win + 1, band_rows):
+            stop = min(start + band_rows, height - win + 1) + win - 1
+            x, y = _broadcast_batch(self.preprocess_image(image1[:, start:stop]),
+                                    self.preprocess_image(image2[:, start:stop]))
+            _, cs_map = _ssim_maps(x, y, kernel, 1.0, sample_covariance=False)
+            total = total + cs_map.flatten(1).sum(1)
+            count += cs_map[0].numel()
+
+        step = max(2, band_rows // 2 * 2)
+        pooled = [torch.cat([F.avg_pool2d(self.preprocess_image(image[:, start:start + step]), kernel_size=2)
+                             for start in range(0, height // 2 * 2, step)], dim=2)
+                  for image in (image1, image2)]
+        factors = [total / count] + _ms_ssim_factors(*pooled, kernel, 1.0, scales - 1)
+        return _combine_ms_ssim(factors, MS_SSIM_WEIGHTS).cpu()
+
+    def calculate_ms_ssim(self, image1, image2):
+        return self.calculate_ms_ssim_batch(image1, image2).mean().item()
+
     def calculate_ssim(self, image1, image2):
-        img1 = self.preprocess_image(image1).cpu().numpy()
-        img2 = self.preprocess_image(image2).cpu().numpy()
-        return ssim(img1[0].transpose(1, 2, 0), img2[0].transpose(1, 2, 0), channel_axis=2, data_range=1.0)
+        return self.calculate_ssim_batch(image1, image2).mean().item()
 
-    def get_inception_features(self, image):
-        image = self.preprocess_image(image)
-        image = torch.nn.functional.interpolate(image, size=(299, 299), mode='bilinear', align_corners=False)
-        image = self.normalize_image(image)
-        with torch.no_grad():
+    def get_inception_features_batch(self, image):
+        image = self._network_input(self.prepare(image).inception_input())
+        with self.inference_context():
             features = self.inception(image)
-        return features.squeeze()
+        return features.float()  # (B, 2048)
 
-    def calculate_feature_similarity(self, image1, image2):
-        feat1 = self.get_inception_features(image1)
-        feat2 = self.get_inception_features(image2)
-        
+    def get_inception_features(self, image):
+        return self.get_inception_features_batch(image).squeeze()
+
+    def feature_similarity_from_features(self, feat1, feat2):
         # Normalize features
-        feat1 = feat1 / feat1.norm()
-        feat2 = feat2 / feat2.norm()
-        
-        # Calculate cosine similarity
-        similarity = torch.dot(feat1, feat2)
-        
-        return similarity.item()
+        feat1 = feat1 / feat1.norm(dim=1, keepdim=True)
+        feat2 = feat2 / feat2.norm(dim=1, keepdim=True)
+
+        # Calculate cosine similarity per item
+        return (feat1 * feat2).sum(dim=1)
+
+    def calculate_feature_similarity_batch(self, image1, image2):
+        feat1 = self.get_inception_features_batch(image1)
+        feat2 = self.get_inception_features_batch(image2)
+        return self.feature_similarity_from_features(feat1, feat2).cpu()
+
+    def calculate_feature_similarity(self, image1, image2):
+        return self.calculate_feature_similarity_batch(image1, image2).mean().item()
+
+    def extract_vgg_features(self, image, content_layer=VGG_CONTENT_LAYER, style_layers=VGG_STYLE_LAYERS, perceptual=True):
+        # One VGG pass over the whole batch collecting everything the perceptual, content and style losses need
+        x = self._network_input(self.prepare(image).normalized())
+        last_layer = VGG_LAST_LAYER if perceptual else max((content_layer, *style_layers))
+        boundaries = tuple(sorted({i for i in (content_layer, *style_layers) if i <= last_layer} | {last_layer}))
+        features = {"style": []}
+        with self.inference_context():
+            for end, segment in zip(boundaries, self._vgg_segments_for(boundaries)):
+                x = segment(x)
+                if end in style_layers:
+                    features["style"].append(gram_matrix(x.float()))
+                if end == content_layer:
+                    features["content"] = x.float()
+        if perceptual:
+            features["perceptual"] = x.float()
+        return features
+
+    def _vgg_layer_scales(self, last_layer):
+        # Downsampling factor of each VGG layer's output
+        scales, scale = [], 1
+        for layer in self.vgg_for(last_layer):
+            if isinstance(layer, nn.MaxPool2d):
+                scale *= 2
+            scales.append(scale)
+        return scales
+
+    def calculate_vgg_losses_tiled(self, image1, image2, tile_size=512, overlap=64, perceptual=True,
+                                   content_layer=VGG_CONTENT_LAYER, style_layers=VGG_STYLE_LAYERS):
+        """VGG losses over overlapping tiles, for images whose activations do not fit in memory.
+
+        Each tile runs with an `overlap` pixel halo; at every capture layer only the tile
+        interior is kept, so Gram matrices and squared errors accumulate exactly once per
+        feature position. Tiles stay on the 32px pooling grid. The halo is shorter than
+        VGG's receptive field, so the losses are not bit-exact: for tiles of at least 256px
+        with the default 64px overlap they stay within VGG_TILED_RTOL (5%) relative error of
+        calculate_vgg_losses_batch, which python_scripts/verify_metric_accuracy.py checks.
+        """
+        image1, image2 = raw_image(image1), raw_image(image2)
+        if image1.shape[1:3] != image2.shape[1:3]:
+            raise ValueError(f"Image sizes do not match: {tuple(image1.shape[1:3])} vs {tuple(image2.shape[1:3])}")
+        tile_size = max(VGG_TILE_ALIGN, tile_size // VGG_TILE_ALIGN * VGG_TILE_ALIGN)
+        overlap = -(-overlap // VGG_TILE_ALIGN) * VGG_TILE_ALIGN
+        height, width = image1.shape[1:3]
+        batch1 = image1.shape[0]
+
+        last_layer = VGG_LAST_LAYER if perceptual else max((content_layer, *style_layers))
+        boundaries = tuple(sorted({i for i in (content_layer, *style_layers) if i <= last_layer} | {last_layer}))
+        segments = self._vgg_segments_for(boundaries)
+        scales = self._vgg_layer_scales(last_layer)
+
+        grams = {layer: [0, 0] for layer in style_layers}
+        gram_pixels = dict.fromkeys(style_layers, 0)
+        squared_errors = {"content_loss": 0, "perceptual_loss": 0}
+        elements = {"content_loss": 0, "perceptual_loss": 0}
+
+        with self.inference_context():
+            for y0 in range(0, height, tile_size):
+                for x0 in range(0, width, tile_size):
+                    y1, x1 = min(y0 + tile_size, height), min(x0 + tile_size, width)
+                    in_y0, in_x0 = max(0, y0 - overlap), max(0, x0 - overlap)
+                    in_y1, in_x1 = min(height, y1 + overlap), min(width, x1 + overlap)
+                    x = torch.cat([self.preprocess_image(image1[:, in_y0:in_y1, in_x0:in_x1]),
+                                   self.preprocess_image(image2[:, in_y0:in_y1, in_x0:in_x1])])
+                    x = self._network_input(self.normalize_image(x))
+
+                    for end, segment in zip(boundaries, segments):
+                        x = segment(x)
+                        scale = scales[end]
+                        top, left = (y0 - in_y0) // scale, (x0 - in_x0) // scale
+                        bottom = x.shape[2] if y1 == height else top + (y1 - y0) // scale
+                        right = x.shape[3] if x1 == width else left + (x1 - x0) // scale
+                        interior = x[:, :, top:bottom, left:right].float()
+                        f1, f2 = interior[:batch1], interior[batch1:]
+
+                        if end in style_layers:
+                            for i, f in enumerate((f1, f2)):
+                                flat = f.reshape(f.shape[0], f.shape[1], -1)
+                                grams[end][i] = grams[end][i] + torch.bmm(flat, flat.transpose(1, 2))
+                            gram_pixels[end] += interior.shape[2] * interior.shape[3]
+                        targets = []
+                        if end == content_layer:
+                            targets.append("content_loss")
+                        if perceptual and end == last_layer:
+                            targets.append("perceptual_loss")
+                        for name in targets:
+                            squared_errors[name] = squared_errors[name] + (f1 - f2).pow(2).flatten(1).sum(1)
+                            elements[name] += f1[0].numel()
+
+        losses = {"content_loss": (squared_errors["content_loss"] / elements["content_loss"]).cpu()}
+        if style_layers:
+            style_loss = 0
+            for layer in style_layers:
+                channels = grams[layer][0].shape[1]
+                norm = channels * gram_pixels[layer]
+                style_loss = style_loss + batch_mse(grams[layer][0] / norm, grams[layer][1] / norm)
+            losses["style_loss"] = style_loss.cpu()
+        if perceptual:
+            losses["perceptual_loss"] = (squared_errors["perceptual_loss"] / elements["perceptual_loss"]).cpu()
+        return losses
+
+    def vgg_losses_from_features(self, features1, features2):
+        # Returns per-item losses as (B,) tensors; style_loss only when style layers were captured
+        losses = {"content_loss": batch_mse(features1["content"], features2["content"]).cpu()}
+        if features1["style"]:
+            losses["style_loss"] = sum(batch_mse(g1, g2) for g1, g2 in zip(features1["style"], features2["style"])).cpu()
+        if "perceptual" in features1 and "perceptual" in features2:
+            losses["perceptual_loss"] = batch_mse(features1["perceptual"], features2["perceptual"]).cpu()
+        return losses
+
+    def calculate_vgg_losses_batch(self, image1, image2):
+        image1, image2 = self.prepare(image1), self.prepare(image2)
+        features1 = self.extract_vgg_features(image1)
+        features2 = self.extract_vgg_features(image2)
+        return self.vgg_losses_from_features(features1, features2)
+
+    def calculate_vgg_losses(self, image1, image2):
+        losses = self.calculate_vgg_losses_batch(image1, image2)
+        return {name: value.mean().item() for name, value in losses.items()}
 
     def calculate_perceptual_loss(self, image1, image2):
-        img1 = self.normalize_image(self.preprocess_image(image1))
-        img2 = self.normalize_image(self.preprocess_image(image2))
-        
-        features1 = self.vgg(img1)
-        features2 = self.vgg(img2)
-        
-        return self.mse_loss(features1, features2).item()
+        return self.calculate_vgg_losses(image1, image2)["perceptual_loss"]
 
-    def calculate_content_loss(self, image1, image2, layer_index=22):  # layer 22 is relu4_4
-        img1 = self.normalize_image(self.preprocess_image(image1))
-        img2 = self.normalize_image(self.preprocess_image(image2))
-        
-        for i, layer in enumerate(self.vgg):
-            img1 = layer(img1)
-            img2 = layer(img2)
-            if i == layer_index:
-                break
-        
-        return self.mse_loss(img1, img2).item()
+    def calculate_content_loss(self, image1, image2, layer_index=VGG_CONTENT_LAYER):
+        image1, image2 = self.prepare(image1), self.prepare(image2)
+        features1 = self.extract_vgg_features(image1, content_layer=layer_index, style_layers=(), perceptual=False)
+        features2 = self.extract_vgg_features(image2, content_layer=layer_index, style_layers=(), perceptual=False)
+        return self.vgg_losses_from_features(features1, features2)["content_loss"].mean().item()
 
     def calculate_style_loss(self, image1, image2):
-        img1 = self.normalize_image(self.preprocess_image(image1))
-        img2 = self.normalize_image(self.preprocess_image(image2))
-        
-        def gram_matrix(x):
-            b, c, h, w = x.size()
-            features = x.view(b * c, h * w)
-            gram = torch.mm(features, features.t())
-            return gram.div(b * c * h * w)
-        
-        style_layers = [0, 5, 10, 19, 28]  # Conv layers
-        style_loss = 0
-        
-        x1, x2 = img1, img2
-        for i, layer in enumerate(self.vgg):
-            x1 = layer(x1)
-            x2 = layer(x2)
-            if i in style_layers:
-                style_loss += self.mse_loss(gram_matrix(x1), gram_matrix(x2))
-        
-        return style_loss.item()
+        image1, image2 = self.prepare(image1), self.prepare(image2)
+        features1 = self.extract_vgg_features(image1, perceptual=False)
+        features2 = self.extract_vgg_features(image2, perceptual=False)
+        return self.vgg_losses_from_features(features1, features2)["style_loss"].mean().item()
+
+    def _cached_features(self, image, config, compute):
+        if self.feature_cache is None:
+            return compute()
+        return self.feature_cache.get_or_compute(raw_image(image), config, compute, self.device, self.feature_cache_disk)
+
+    def inception_features_pair(self, image1, image2):
+        # Reference features go through the feature cache; (B1, 2048) and (B2, 2048)
+        ref_features = self._cached_features(
+            image1, f"inception_v3:{self.inference_backend}", lambda: self.get_inception_features_batch(image1))
+        return ref_features, self.get_inception_features_batch(image2)
+
+    def calculate_batch_metrics(self, image1, image2, metrics=ALL_METRICS, eval_resolution=None,
+                                max_memory_mb=0, tile_overlap=64, feature_sink=None, timings=None):
+        # Requested metrics for every pair in the batch, each computed in one vectorized call.
+        # image1 is the reference; its deep features go through the feature cache.
+        # Only the networks the requested metrics need are ever loaded.
+        # With max_memory_mb, SSIM and MS-SSIM stream over row bands and the VGG losses are tiled
+        # whenever the full image would not fit the budget; the Inception input is resized before
+        # it is converted, so no full-size float copy is made.
+        # A feature_sink dict receives the Inception features so callers can reuse them.
+        # A timings dict receives the wall/CPU time and memory cost of every phase (see timed_phase).
+        with torch.inference_mode():
+            return self._calculate_batch_metrics(image1, image2, metrics, eval_resolution, max_memory_mb, tile_overlap,
+                                                 feature_sink, timings)
+
+    def _calculate_batch_metrics(self, image1, image2, metrics, eval_resolution, max_memory_mb, tile_overlap,
+                                 feature_sink, timings):
+        max_bytes = max_memory_mb * 1024**2
+        with timed_phase(timings, "preprocessing", self.device):
+            # Each tensor is converted once here; all metrics below share its PreparedImage views
+            if eval_resolution:
+                resized1 = downscale_image(raw_image(image1), eval_resolution)
+                resized2 = downscale_image(raw_image(image2), eval_resolution)
+                image1 = image1 if resized1 is raw_image(image1) else resized1
+                image2 = image2 if resized2 is raw_image(image2) else resized2
+            image1, image2 = self.prepare(image1), self.prepare(image2)
+            if not max_bytes:
+                image1.float(), image2.float()
+        height, width = image2.image.shape[1:3]
+        batch_size = image1.image.shape[0] + image2.image.shape[0]
+        backend = self.inference_backend
+        vgg_metrics = [name for name in VGG_METRICS if name in metrics]
+
+        # Resolve the networks up front so loading is not billed to the first metric that uses them
+        with timed_phase(timings, "model_loading", self.device):
+            for name in metric_models(metrics):
+                self.model_registry.get(name, self.device, backend)
+
+        results = {}
+        capped_rows = ssim_band_rows_for_memory(max_bytes, batch_size, width) if max_bytes else height
+        if "ssim" in metrics:
+            with timed_phase(timings, "ssim", self.device):
+                band_rows = min(capped_rows, self.ssim_band_rows) if self.ssim_band_rows else capped_rows
+                if band_rows < height:
+                    results["ssim"] = self.calculate_ssim_batch_streaming(image1, image2, band_rows)
+                else:
+                    results["ssim"] = self.calculate_ssim_batch(image1, image2)
+        if "ms_ssim" in metrics:
+            with timed_phase(timings, "ms_ssim", self.device):
+                if capped_rows < height:
+                    results["ms_ssim"] = self.calculate_ms_ssim_batch_streaming(image1, image2, capped_rows)
+                else:
+                    results["ms_ssim"] = self.calculate_ms_ssim_batch(image1, image2)
+
+        if "feature_similarity" in metrics:
+            with timed_phase(timings, "feature_similarity", self.device):
+                ref_inception, out_inception = self.inception_features_pair(image1, image2)
+                results["feature_similarity"] = self.feature_similarity_from_features(ref_inception, out_inception).cpu()
+            if feature_sink is not None:
+                feature_sink["inception"] = (ref_inception, out_inception)
+
+        if vgg_metrics:
+            # Perceptual, content and style losses share one VGG pass and are timed together
+            with timed_phase(timings, "vgg_losses", self.device):
+                perceptual = "perceptual_loss" in metrics
+                tile_size = vgg_tile_size_for_memory(max_bytes, batch_size, tile_overlap) if max_bytes else None
+                if tile_size and max(height, width) > tile_size:
+                    # Gram statistics are accumulated tile by tile, so the feature cache is bypassed here
+                    losses = self.calculate_vgg_losses_tiled(image1, image2, tile_size, tile_overlap, perceptual)
+                else:
+                    ref_vgg = self._cached_features(
+                        image1, f"vgg19:{backend}:content={VGG_CONTENT_LAYER}:style={VGG_STYLE_LAYERS}:perceptual={perceptual}",
+                        lambda: self.extract_vgg_features(image1, perceptual=perceptual))
+                    losses = self.vgg_losses_from_features(ref_vgg, self.extract_vgg_features(image2, perceptual=perceptual))
+            results.update({name: losses[name] for name in vgg_metrics})
+
+        return {name: values.tolist() for name, values in results.items()}
+
+    @staticmethod
+    def aggregate_metrics(metrics):
+        aggregates = {}
+        for name, values in metrics.items():
+            values = np.asarray(values, dtype=np.float64)
+            aggregates[name] = {
+                "mean": float(values.mean()),
+                "std": float(values.std()),
+                "min": float(values.min()),
+                "max": float(values.max()),
+            }
+        return aggregates
+
+
+class RunningFeatureStatistics:
+    """Running mean/covariance of feature vectors (batched Welford / Chan update) plus a
+    fixed-size reservoir sample for KID. Memory stays constant however many images are added."""
+
+    def __init__(self, dim=2048, reservoir_size=1000, seed=0):
+        self.dim = dim
+        self.reservoir_size = reservoir_size
+        self.count = 0
+        self.mean = np.zeros(dim, dtype=np.float64)
+        self.m2 = np.zeros((dim, dim), dtype=np.float64)
+        self.reservoir = np.zeros((0, dim), dtype=np.float32)
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, features):
+        features = np.asarray(features, dtype=np.float64).reshape(-1, self.dim)
+        batch_count = len(features)
+        if batch_count == 0:
+            return
+        batch_mean = features.mean(axis=0)
+        centered = features - batch_mean
+        batch_m2 = centered.T @ centered
+
+        previous = self.count
+        total = previous + batch_count
+        delta = batch_mean - self.mean
+        self.mean += delta * batch_count / total
+        self.m2 += batch_m2 + np.outer(delta, delta) * previous * batch_count / total
+        self.count = total
+
+        for offset, feature in enumerate(features):
+            # Reservoir sampling (Algorithm R) keeps a uniform sample of everything seen
+            if len(self.reservoir) < self.reservoir_size:
+                self.reservoir = np.vstack([self.reservoir, feature.astype(np.float32)[None]])
+            else:
+                slot = self._rng.integers(0, previous + offset + 1)
+                if slot < self.reservoir_size:
+                    self.reservoir[slot] = feature
+
+    def covariance(self):
+        return self.m2 / max(self.count - 1, 1)
+
+    def state_dict(self, prefix):
+        return {f"{prefix}count": np.array(self.count), f"{prefix}mean": self.mean, f"{prefix}m2": self.m2,
+                f"{prefix}reservoir": self.reservoir}
+
+    def load_state_dict(self, state, prefix):
+        self.count = int(state[f"{prefix}count"])
+        self.mean = state[f"{prefix}mean"].astype(np.float64)
+        self.m2 = state[f"{prefix}m2"].astype(np.float64)
+        self.reservoir = state[f"{prefix}reservoir"].astype(np.float32)
+
+
+class InceptionDistributionMetrics:
+    """Streaming FID/KID between a reference and a generated set of Inception features.
+
+    The state covers the current window (everything since the last reset) and is persisted
+    to ``state_path`` every ``save_every`` updates and at interpreter exit.
+    """
+
+    def __init__(self, state_path=INCEPTION_STATISTICS_PATH, reservoir_size=1000, save_every=10):
+        self.state_path = state_path
+        self.save_every = save_every
+        self.reservoir_size = reservoir_size
+        self._lock = threading.Lock()
+        self._pending_updates = 0
+        self._seen_references = set()
+        self.reset(persist=False)
+        self.load()
+        atexit.register(self.save)
+
+    def reset(self, persist=True):
+        with self._lock:
+            self.reference = RunningFeatureStatistics(reservoir_size=self.reservoir_size, seed=0)
+            self.generated = RunningFeatureStatistics(reservoir_size=self.reservoir_size, seed=1)
+            self._seen_references = set()
+        if persist:
+            self.save()
+
+    def update(self, reference_features, generated_features, reference_key=None):
+        # The reference is usually the same image run after run; it is only counted once per key
+        with self._lock:
+            if reference_key is None or reference_key not in self._seen_references:
+                self.reference.update(reference_features.detach().cpu().numpy())
+                if reference_key is not None:
+                    self._seen_references.add(reference_key)
+            self.generated.update(generated_features.detach().cpu().numpy())
+            self._pending_updates += 1
+            save_now = self._pending_updates >= self.save_every
+        if save_now:
+            self.save()
+
+    def fid(self):
+        if self.reference.count < 2 or self.generated.count < 2:
+            return None
+        from scipy import linalg  # Only needed when FID is reported
+
+        mu1, mu2 = self.reference.mean, self.generated.mean
+        sigma1, sigma2 = self.reference.covariance(), self.generated.covariance()
+        covmean, _ = linalg.sqrtm(sigma1.dot(sigma2), disp=False)
+        if not np.isfinite(covmean).all():
+            offset = np.eye(sigma1.shape[0]) * 1e-6
+            covmean = linalg.sqrtm((sigma1 + offset).dot(sigma2 + offset))
+        covmean = np.real(covmean)
+        diff = mu1 - mu2
+        return float(diff.dot(diff) + np.trace(sigma1) + np.trace(sigma2) - 2 * np.trace(covmean))
+
+    def kid(self, num_subsets=50, subset_size=500, seed=0):
+        # Unbiased MMD^2 with the cubic polynomial kernel, averaged over random subsets of the reservoirs
+        ref, gen = self.reference.reservoir.astype(np.float64), self.generated.reservoir.astype(np.float64)
+        m = min(subset_size, len(ref), len(gen))
+        if m < 2:
+            return None
+        rng = np.random.default_rng(seed)
+        dim = ref.shape[1]
+        values = []
+        for _ in range(num_subsets):
+            x = ref[rng.choice(len(ref), m, replace=False)]
+            y = gen[rng.choice(len(gen), m, replace=False)]
+            k_xx = (x @ x.T / dim + 1) ** 3
+            k_yy = (y @ y.T / dim + 1) ** 3
+            k_xy = (x @ y.T / dim + 1) ** 3
+            mmd = ((k_xx.sum() - np.trace(k_xx)) + (k_yy.sum() - np.trace(k_yy))) / (m * (m - 1)) \
+                - 2 * k_xy.mean()
+            values.append(mmd)
+        return float(np.mean(values)), float(np.std(values))
+
+    def summary(self):
+        kid = self.kid()
+        return {"reference_count": self.reference.count, "generated_count": self.generated.count,
+                "fid": self.fid(), "kid": kid[0] if kid else None, "kid_std": kid[1] if kid else None}
+
+    def report_string(self, summary=None):
+        summary = summary or self.summary()
+        report = (f"Distribution Window: {summary['reference_count']} reference / "
+                  f"{summary['generated_count']} generated images\n")
+        if summary["fid"] is not None:
+            report += f"FID: {summary['fid']:.4f}\n"
+        else:
+            report += "FID: N/A (needs at least 2 images per set)\n"
+        if summary["kid"] is not None:
+            report += f"KID: {summary['kid']:.6f} ± {summary['kid_std']:.6f}\n"
+        else:
+            report += "KID: N/A (needs at least 2 images per set)\n"
+        return report
+
+    def save(self):
+        if not self.state_path:
+            return
+        with self._lock:
+            state = {**self.reference.state_dict("reference_"), **self.generated.state_dict("generated_"),
+                     "seen_references": np.array(sorted(self._seen_references), dtype=str)}
+            self._pending_updates = 0
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **state)
+        os.replace(tmp_path, self.state_path)
+
+    def load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with np.load(self.state_path) as state:
+                with self._lock:
+                    self.reference.load_state_dict(state, "reference_")
+                    self.generated.load_state_dict(state, "generated_")
+                    self._seen_references = set(state["seen_references"].tolist())
+        except Exception as e:
+            print(f"Ignoring unreadable Inception statistics {self.state_path}: {e}")
+
+
+_distribution_metrics = None
+
+
+def get_distribution_metrics():
+    # Created on first use so the persisted state is only read when FID/KID is enabled
+    global _distribution_metrics
+    if _distribution_metrics is None:
+        _distribution_metrics = InceptionDistributionMetrics()
+    return _distribution_metrics
+
+
+class PerformanceLogStore:
+    """Append-only JSONL performance log, one record per run, rotated into size-bounded segments."""
+
+    def __init__(self, log_dir=PERFORMANCE_LOG_DIR, max_segment_bytes=16 * 1024**2):
+        self.log_dir = log_dir
+        self.max_segment_bytes = max_segment_bytes
+        self._lock = threading.Lock()
+
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.log_dir, "performance-*.jsonl")))
+
+    def _segment_for(self, size):
+        segments = self.segments()
+        if segments and os.path.getsize(segments[-1]) + size <= self.max_segment_bytes:
+            return segments[-1]
+        index = int(os.path.basename(segments[-1])[len("performance-"):-len(".jsonl")]) + 1 if segments else 0
+        return os.path.join(self.log_dir, f"performance-{index:06d}.jsonl")
+
+    def append(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        data = line.encode("utf-8")
+        with self._lock:
+            os.makedirs(self.log_dir, exist_ok=True)
+            path = self._segment_for(len(data))
+            # A single O_APPEND write keeps lines whole when several processes share the directory
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+        return path
+
+    def iter_records(self):
+        for path in self.segments():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+
+PERFORMANCE_LOG_STORE = PerformanceLogStore()
+
+
+class MetricJobQueue:
+    """Bounded background worker pool that runs metric jobs off the workflow's critical path."""
+
+    def __init__(self, workers=1, max_pending=8, keep_results=256):
+        self.workers = workers
+        self.keep_results = keep_results
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = OrderedDict()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _ensure_workers(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, name=f"metric-worker-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, fn, *args, block=True):
+        # block=False drops the job (returns None) instead of waiting when the queue is full
+        self._ensure_workers()
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._jobs[job_id] = {"status": "queued", "result": None, "event": threading.Event()}
+            self._trim()
+        try:
+            self._queue.put((job_id, fn, args), block=block)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+                self.dropped += 1
+            return None
+        return job_id
+
+    def _worker(self):
+        while True:
+            job_id, fn, args = self._queue.get()
+            job = self._jobs[job_id]
+            job["status"] = "running"
+            try:
+                job["result"] = fn(*args)
+                job["status"] = "done"
+            except Exception:
+                job["result"] = f"Asynchronous metric job {job_id} failed:\n{traceback.format_exc()}"
+                job["status"] = "failed"
+            finally:
+                job["event"].set()
+                self._queue.task_done()
+
+    def _trim(self):
+        # Forget the oldest finished jobs; queued and running ones are always kept
+        finished = [job_id for job_id, job in self._jobs.items() if job["event"].is_set()]
+        for job_id in finished[:max(0, len(self._jobs) - self.keep_results)]:
+            del self._jobs[job_id]
 
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        return job["status"] if job else "unknown"
+
+    def result(self, job_id, timeout=None):
+        job = self._jobs.get(job_id)
+        if job is None or not job["event"].wait(timeout):
+            return None
+        return job["result"]
+
+    def pending(self):
+        return self._queue.qsize()
+
+
+METRIC_JOBS = MetricJobQueue()
+
+
+def _peak_rss_bytes():
+    # Process-lifetime peak resident set size
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+    except ImportError:  # Windows
+        try:
+            import psutil
+            info = psutil.Process().memory_info()
+            return getattr(info, "peak_wset", info.rss)
+        except ImportError:
+            return None
+
+
+def _current_rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, AttributeError):
+            return None
+
+
+def resource_snapshot(name):
+    snapshot = {
+        "name": name,
+        "wall": time.perf_counter(),
+        "cpu": time.process_time(),
+        "rss": _current_rss_bytes(),
+        "peak_rss": _peak_rss_bytes(),
+    }
+    if tracemalloc.is_tracing():
+        snapshot["tracemalloc_peak"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()  # Each stage reports its own Python allocation peak
+    return snapshot
+
+
+def _format_mb(value):
+    return "N/A" if value is None else f"{value / 1024**2:.2f} MB"
+
+
+def stage_splits(snapshots):
+    # Per-stage deltas between consecutive snapshots (start, checkpoints..., end)
+    stages = []
+    for previous, current in zip(snapshots, snapshots[1:]):
+        stage = {
+            "stage": current["name"],
+            "wall_s": current["wall"] - previous["wall"],
+            "cpu_s": current["cpu"] - previous["cpu"],
+            "rss_end_mb": None if current["rss"] is None else current["rss"] / 1024**2,
+        }
+        if previous["rss"] is not None and current["rss"] is not None:
+            stage["rss_change_mb"] = (current["rss"] - previous["rss"]) / 1024**2
+        if "tracemalloc_peak" in current:
+            stage["tracemalloc_peak_mb"] = current["tracemalloc_peak"] / 1024**2
+        stages.append(stage)
+    return stages
+
+
+class AnyType(str):
+    # ComfyUI wildcard type: compares equal to every other type so any output can be linked
+    def __ne__(self, other):
+        return False
+
+
+ANY_TYPE = AnyType("*")
 
 
 class PerformanceMeasurementStartNode:
@@ -120,6 +1347,10 @@ class PerformanceMeasurementStartNode:
             "required": {
                 "original_image": ("IMAGE",),
                 "input_image": ("IMAGE",),
+            },
+            "optional": {
+                "trace_python_allocations": ("BOOLEAN", {"default": False}),
+                "torch_profiler": ("BOOLEAN", {"default": False}),
             }
         }
     
@@ -128,17 +1359,69 @@ class PerformanceMeasurementStartNode:
     FUNCTION = "start_measurement"
     CATEGORY = "performance"
 
-    def start_measurement(self, original_image, input_image):
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        return float("nan")  # The context holds this run's start time and profiler; never reuse a cached one
+
+    def start_measurement(self, original_image, input_image, trace_python_allocations=False, torch_profiler=False):
         context = {
             "start_time": time.time(),
-            "start_gpu_memory": torch.cuda.memory_allocated() if torch.cuda.is_available() else 0
+            "start_gpu_memory": torch.cuda.memory_allocated() if torch.cuda.is_available() else 0,
+            "started_tracemalloc": False,
+            "profiler": None,
+            # Shared by the checkpoint copies of the context, so the profiler is only ever exited once
+            "profiler_state": {"exited": False},
         }
+        if trace_python_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            context["started_tracemalloc"] = True
+        if torch_profiler:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            context["profiler"] = torch.profiler.profile(activities=activities)
+            context["profiler"].__enter__()
+        context["snapshots"] = [resource_snapshot("start")]
         return (original_image, input_image, context)
 
 
+class PerformanceCheckpointNode:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "value": (ANY_TYPE,),
+                "performance_context": ("PERFORMANCE_CONTEXT",),
+                "stage_name": ("STRING", {"default": "stage"}),
+            }
+        }
+
+    RETURN_TYPES = (ANY_TYPE, "PERFORMANCE_CONTEXT")
+    RETURN_NAMES = ("value", "performance_context")
+    FUNCTION = "checkpoint"
+    CATEGORY = "performance"
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        return float("nan")  # Snapshots must be taken on every run, not replayed from the cache
+
+    def checkpoint(self, value, performance_context, stage_name):
+        # Runs once `value` is ready, closing the stage that produced it. The context is
+        # copied rather than mutated so parallel branches keep their own checkpoint chains.
+        context = dict(performance_context)
+        context["snapshots"] = list(performance_context.get("snapshots", [])) + [resource_snapshot(stage_name)]
+        return (value, context)
+
+
 
 class PerformanceMeasurementEndNode:
+    # Running metric overhead per profile: {profile: [runs, total_seconds]}
+    profile_overhead = {}
+    # Running cost per metric phase: {phase: [runs, total_seconds]}
+    phase_overhead = {}
+
     def __init__(self):
+        # Cheap: metric networks are loaded on first use and shared through MODEL_REGISTRY
         self.perf_measure = PerformanceMeasurement()
 
     @classmethod
@@ -149,15 +1432,87 @@ class PerformanceMeasurementEndNode:
                 "input_image": ("IMAGE",),
                 "output_image": ("IMAGE",),
                 "performance_context": ("PERFORMANCE_CONTEXT",),
+            },
+            "optional": {
+                # Batches are always scored in one vectorized pass; this only controls the report
+                "batch_mode": (["summary", "per_item"], {"default": "summary"}),
+                "feature_cache": (["memory", "memory+disk", "off"], {"default": "memory"}),
+                "metric_profile": (list(METRIC_PROFILES), {"default": "full"}),
+                "inference_backend": (list(INFERENCE_BACKENDS), {"default": "fp32"}),
+                # 0 disables tiling; otherwise SSIM streams and VGG losses are tiled to stay under the cap.
+                # VGG tiles never go below 256px, so caps under ~216 MB per image pair are exceeded there
+                "max_metric_memory_mb": ("INT", {"default": 0, "min": 0, "max": 65536, "step": 64}),
+                "tile_overlap": ("INT", {"default": 64, "min": 0, "max": 512, "step": 32}),
+                # Streaming FID/KID over the run window; "reset" starts a new window with this run
+                "distribution_metrics": (["off", "accumulate", "report", "reset"], {"default": "off"}),
+                # async returns immediately with a job id; "drop" skips the metrics when the queue is full
+                "execution_mode": (["sync", "async"], {"default": "sync"}),
+                "async_queue_policy": (["block", "drop"], {"default": "block"}),
+                # jsonl appends one structured record per run to rotated performance-*.jsonl segments
+                "log_format": (["jsonl", "text", "both"], {"default": "jsonl"}),
+                # 0 uses the profile's own evaluation resolution
+                "eval_resolution": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 64}),
+                "ssim": (["profile", "on", "off"], {"default": "profile"}),
+                "ms_ssim": (["profile", "on", "off"], {"default": "profile"}),
+                "feature_similarity": (["profile", "on", "off"], {"default": "profile"}),
+                "perceptual_loss": (["profile", "on", "off"], {"default": "profile"}),
+                "content_loss": (["profile", "on", "off"], {"default": "profile"}),
+                "style_loss": (["profile", "on", "off"], {"default": "profile"}),
             }
         }
     
-    RETURN_TYPES = ("IMAGE", "STRING")
-    RETURN_NAMES = ("output_image", "performance_metrics")
+    RETURN_TYPES = ("IMAGE", "STRING", "STRING")
+    RETURN_NAMES = ("output_image", "performance_metrics", "metrics_job_id")
     FUNCTION = "end_measurement"
     CATEGORY = "performance"
 
-    def end_measurement(self, original_image, input_image, output_image, performance_context):
+    def _profiling_report(self, performance_context, record):
+        snapshots = performance_context.get("snapshots")
+        if not snapshots:
+            return ""
+        snapshots = snapshots + [resource_snapshot("end")]
+        start, end = snapshots[0], snapshots[-1]
+        stages = stage_splits(snapshots)
+        resources = {
+            "wall_s": end["wall"] - start["wall"],
+            "cpu_s": end["cpu"] - start["cpu"],
+            "rss_start_mb": None if start["rss"] is None else start["rss"] / 1024**2,
+            "rss_end_mb": None if end["rss"] is None else end["rss"] / 1024**2,
+            "peak_rss_mb": None if end["peak_rss"] is None else end["peak_rss"] / 1024**2,
+        }
+        report = f"    Wall Time (monotonic): {resources['wall_s']:.2f} seconds\n"
+        report += f"    Process CPU Time: {resources['cpu_s']:.2f} seconds\n"
+        report += f"    RSS: {_format_mb(start['rss'])} -> {_format_mb(end['rss'])} (peak {_format_mb(end['peak_rss'])})\n"
+
+        if performance_context.get("started_tracemalloc") and tracemalloc.is_tracing():
+            resources["tracemalloc_peak_mb"] = max(stage.get("tracemalloc_peak_mb", 0) for stage in stages)
+            report += f"    Python Allocation Peak: {resources['tracemalloc_peak_mb']:.2f} MB\n"
+            tracemalloc.stop()
+        profiler = performance_context.get("profiler")
+        profiler_state = performance_context.get("profiler_state", {})
+        if profiler is not None and not profiler_state.get("exited"):
+            profiler_state["exited"] = True
+            profiler.__exit__(None, None, None)
+            os.makedirs(PROFILER_TRACE_DIR, exist_ok=True)
+            trace_path = os.path.join(PROFILER_TRACE_DIR, f"trace_{record['run_id']}.json")
+            profiler.export_chrome_trace(trace_path)
+            resources["torch_trace"] = trace_path
+            report += f"    Torch Profiler Trace: {trace_path}\n"
+
+        if len(stages) > 1:
+            report += "    Stage Timings:\n"
+            for stage in stages:
+                report += (f"        {stage['stage']}: {stage['wall_s']:.2f} s wall, {stage['cpu_s']:.2f} s CPU"
+                           f", RSS change {stage.get('rss_change_mb', float('nan')):.2f} MB\n")
+        record["resources"] = resources
+        record["stages"] = stages
+        return report
+
+    def end_measurement(self, original_image, input_image, output_image, performance_context, batch_mode="summary",
+                        feature_cache="memory", metric_profile="full", eval_resolution=0,
+                        inference_backend="fp32", max_metric_memory_mb=0, tile_overlap=64,
+                        distribution_metrics="off", execution_mode="sync", async_queue_policy="block",
+                        log_format="jsonl", **metric_toggles):
         end_time = time.time()
         execution_time = end_time - performance_context["start_time"]
 
@@ -169,25 +1524,92 @@ class PerformanceMeasurementEndNode:
             gpu_usage = f"{gpu_memory_change / 1024**2:.2f} MB"
             gpu_model = torch.cuda.get_device_name(0)
 
+        record = {
+            "run_id": uuid.uuid4().hex,
+            "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+            "execution_time_s": execution_time,
+            "gpu_model": gpu_model,
+            "gpu_memory_change_mb": gpu_memory_change / 1024**2 if torch.cuda.is_available() else None,
+            "metric_profile": metric_profile,
+            "inference_backend": inference_backend,
+            "execution_mode": execution_mode,
+        }
+
+        try:
+            profiling_report = self._profiling_report(performance_context, record)
+        except Exception as e:
+            profiling_report = f"    Error occurred during profiling report: {str(e)}\n"
+            record["profiling_error"] = str(e)
+
         performance_string = f"""Performance Metrics:
     Execution Time: {execution_time:.2f} seconds
     GPU Model: {gpu_model}
     GPU Memory Usage Change: {gpu_usage}
-    ------------------------------------------\n"""
+{profiling_report}    ------------------------------------------\n"""
+        settings = {
+            "log_format": log_format,
+            "batch_mode": batch_mode,
+            "feature_cache": feature_cache,
+            "metric_profile": metric_profile,
+            "eval_resolution": eval_resolution,
+            "inference_backend": inference_backend,
+            "max_metric_memory_mb": max_metric_memory_mb,
+            "tile_overlap": tile_overlap,
+            "distribution_metrics": distribution_metrics,
+            "metric_toggles": metric_toggles,
+        }
+
+        if execution_mode == "async":
+            # The worker gets its own node (models are shared) and private copies of the images
+            images = tuple(image.detach().clone() for image in (original_image, input_image, output_image))
+            job_id = METRIC_JOBS.submit(PerformanceMeasurementEndNode()._complete_measurement, performance_string,
+                                        *images, settings, record, block=(async_queue_policy == "block"))
+            if job_id is None:
+                performance_string += f"Metric calculation skipped: async queue is full ({METRIC_JOBS.dropped} dropped)\n"
+                record["error"] = "async queue full"
+                self.log_performance(performance_string, record, log_format)
+                return (output_image, performance_string, "")
+            record["job_id"] = job_id
+            performance_string += f"Metrics queued asynchronously: job {job_id} ({METRIC_JOBS.pending()} pending)\n"
+            return (output_image, performance_string, job_id)
+
+        performance_string = self._complete_measurement(performance_string, original_image, input_image, output_image,
+                                                        settings, record)
+        return (output_image, performance_string, "")
+
+    def _complete_measurement(self, performance_string, original_image, input_image, output_image, settings,
+                              record=None):
+        record = {} if record is None else record
+        self.perf_measure.feature_cache = None if settings["feature_cache"] == "off" else FEATURE_CACHE
+        self.perf_measure.feature_cache_disk = settings["feature_cache"] == "memory+disk"
+        self.perf_measure.inference_backend = settings["inference_backend"]
+
+        metric_names, resolution = resolve_metric_profile(settings["metric_profile"], settings["metric_toggles"],
+                                                          settings["eval_resolution"])
 
         try:
-            performance_string += self._calculate_metrics(original_image, input_image, output_image)
+            metric_start = time.perf_counter()
+            performance_string += self._calculate_metrics(original_image, input_image, output_image,
+                                                          settings["batch_mode"], metric_names, resolution,
+                                                          settings["max_metric_memory_mb"], settings["tile_overlap"],
+                                                          settings["distribution_metrics"], record)
+            record["metric_overhead_s"] = time.perf_counter() - metric_start
+            performance_string += self._profile_overhead_string(settings["metric_profile"], record["metric_overhead_s"])
         except Exception as e:
             performance_string += f"Error occurred during metric calculation: {str(e)}\n"
             performance_string += f"Traceback: {traceback.format_exc()}\n"
             performance_string += self._debug_image_info(original_image, input_image, output_image)
+            record["error"] = str(e)
 
-        self.log_performance(performance_string)
+        self.log_performance(performance_string, record, settings["log_format"])
 
-        return (output_image, performance_string)
+        return performance_string
 
-    def _calculate_metrics(self, original_image, input_image, output_image):
+    def _calculate_metrics(self, original_image, input_image, output_image, batch_mode="summary",
+                           metric_names=ALL_METRICS, eval_resolution=None, max_memory_mb=0, tile_overlap=64,
+                           distribution_metrics="off", record=None):
         metrics = ""
+        record = {} if record is None else record
         
         def categorize_ssim(value):
             if value > 0.98: return "Çok Yüksek Benzerlik"
@@ -224,22 +1646,107 @@ class PerformanceMeasurementEndNode:
             elif value < 1.0: return "Düşük Benzerlik"
             else: return "Çok Düşük Benzerlik"
 
-        ssim_oo = self.perf_measure.calculate_ssim(original_image, output_image)
-        ssim_io = self.perf_measure.calculate_ssim(input_image, output_image)
-        ssim_oi = self.perf_measure.calculate_ssim(original_image, input_image)
-        feature_sim = self.perf_measure.calculate_feature_similarity(original_image, output_image)
-        perceptual_loss = self.perf_measure.calculate_perceptual_loss(original_image, output_image)
-        content_loss = self.perf_measure.calculate_content_loss(original_image, output_image)
-        style_loss = self.perf_measure.calculate_style_loss(original_image, output_image)
+        # Every pair in the batch is scored at once; a single original broadcasts over the outputs
+        feature_sink = {}
+        timings = {}
+        original_image, output_image = self.perf_measure.prepare(original_image), self.perf_measure.prepare(output_image)
+        batch_metrics = self.perf_measure.calculate_batch_metrics(original_image, output_image, metric_names,
+                                                                  eval_resolution, max_memory_mb, tile_overlap,
+                                                                  feature_sink, timings)
+        record["metric_timings"] = timings
+        if not batch_metrics:
+            return "No metrics enabled\n"
+        aggregates = self.perf_measure.aggregate_metrics(batch_metrics)
+        batch_size = len(next(iter(batch_metrics.values())))
+        record["batch_size"] = batch_size
+        record["metrics"] = {name: stats["mean"] for name, stats in aggregates.items()}
+        record["metric_versions"] = {name: METRIC_VERSIONS[name] for name in batch_metrics}
+        if batch_size > 1:
+            record["metrics_std"] = {name: stats["std"] for name, stats in aggregates.items()}
+            record["per_item"] = batch_metrics
+
+        report = [
+            ("ssim", "SSIM", categorize_ssim),
+            ("ms_ssim", "MS-SSIM", categorize_ssim),
+            ("feature_similarity", "Feature Similarity", categorize_feature_similarity),
+            ("perceptual_loss", "Perceptual Loss", categorize_perceptual_loss),
+            ("content_loss", "Content Loss", categorize_content_loss),
+            ("style_loss", "Style Loss", categorize_style_loss),
+        ]
+        report = [row for row in report if row[0] in batch_metrics]
+
+        if batch_size > 1:
+            metrics += f"Batch Size: {batch_size}\n"
+        for key, label, categorize in report:
+            stats = aggregates[key]
+            metrics += f"{label} (Original vs Output): {stats['mean']:.4f} - {categorize(stats['mean'])}"
+            if batch_size > 1:
+                metrics += f" (mean; min {stats['min']:.4f}, max {stats['max']:.4f}, std {stats['std']:.4f})"
+            metrics += "\n"
 
-        metrics += f"SSIM (Original vs Output): {ssim_oo:.4f} - {categorize_ssim(ssim_oo)}\n"
-        metrics += f"Feature Similarity (Original vs Output): {feature_sim:.4f} - {categorize_feature_similarity(feature_sim)}\n"
-        metrics += f"Perceptual Loss (Original vs Output): {perceptual_loss:.4f} - {categorize_perceptual_loss(perceptual_loss)}\n"
-        metrics += f"Content Loss (Original vs Output): {content_loss:.4f} - {categorize_content_loss(content_loss)}\n"
-        metrics += f"Style Loss (Original vs Output): {style_loss:.4f} - {categorize_style_loss(style_loss)}\n"
+        if batch_mode == "per_item" and batch_size > 1:
+            metrics += "Per-Item Metrics:\n"
+            for i in range(batch_size):
+                values = ", ".join(f"{label}: {batch_metrics[key][i]:.4f}" for key, label, _ in report)
+                metrics += f"    [{i}] {values}\n"
+
+        if distribution_metrics != "off":
+            with timed_phase(timings, "distribution_metrics", self.perf_measure.device):
+                metrics += self._update_distribution_metrics(original_image, output_image, feature_sink,
+                                                             distribution_metrics, record)
+        metrics += self._metric_timings_string(timings)
+
+        if self.perf_measure.feature_cache is not None:
+            metrics += self.perf_measure.feature_cache.stats_string()
+            record["feature_cache"] = self.perf_measure.feature_cache.stats()
+        metrics += f"Inference Backend: {self.perf_measure.inference_backend}\n"
+        metrics += f"Loaded Models: {', '.join(self.perf_measure.model_registry.loaded()) or 'none'}\n"
+        if self.perf_measure.device.type == "cpu":
+            threads = CPU_THREAD_SETTINGS
+            metrics += (f"CPU Threads: intra-op {threads['intra_op_threads']}, inter-op {threads['inter_op_threads']}"
+                        f", SSIM band rows {threads['ssim_band_rows'] or 'full'} ({threads['source']})\n")
+            record["cpu_threads"] = dict(threads)
 
         return metrics
 
+    def _update_distribution_metrics(self, original_image, output_image, feature_sink, mode, record):
+        distribution = get_distribution_metrics()
+        if mode == "reset":
+            distribution.reset()
+        if "inception" in feature_sink:
+            ref_features, out_features = feature_sink["inception"]
+        else:
+            with torch.inference_mode():
+                ref_features, out_features = self.perf_measure.inception_features_pair(original_image, output_image)
+        distribution.update(ref_features, out_features, reference_key=FeatureCache.make_key(raw_image(original_image), "reference"))
+        if mode == "accumulate":
+            record["distribution"] = {"generated_count": distribution.generated.count}
+            return f"Distribution Window: {distribution.generated.count} generated images accumulated\n"
+        record["distribution"] = distribution.summary()
+        return distribution.report_string(record["distribution"])
+
+    def _metric_timings_string(self, timings):
+        lines = "Metric Timings:\n"
+        for phase, timing in timings.items():
+            runs, total = self.phase_overhead.get(phase, [0, 0.0])
+            runs, total = runs + 1, total + timing["wall_s"]
+            self.phase_overhead[phase] = [runs, total]
+            if "peak_memory_mb" in timing:
+                memory = f"peak GPU {timing['peak_memory_mb']:.2f} MB"
+            elif timing.get("rss_change_mb") is not None:
+                memory = f"RSS change {timing['rss_change_mb']:.2f} MB"
+            else:
+                memory = "memory N/A"
+            lines += (f"    {phase}: {timing['wall_s']:.3f} s wall, {timing['cpu_s']:.3f} s CPU, {memory}"
+                      f" (avg {total / runs:.3f} s over {runs} runs)\n")
+        return lines
+
+    def _profile_overhead_string(self, profile, overhead):
+        runs, total = self.profile_overhead.get(profile, [0, 0.0])
+        runs, total = runs + 1, total + overhead
+        self.profile_overhead[profile] = [runs, total]
+        return f"Metric Profile: {profile} - Overhead: {overhead:.2f} seconds (avg {total / runs:.2f} over {runs} runs)\n"
+
     def _debug_image_info(self, original_image, input_image, output_image):
         debug_info = "Debug Image Information:\n"
         debug_info += f"Original Image Shape: {original_image.shape}, dtype: {original_image.dtype}\n"
@@ -248,23 +1755,63 @@ class PerformanceMeasurementEndNode:
         return debug_info
 
     @staticmethod
-    def log_performance(performance_string):
-        log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "performance")
-        os.makedirs(log_dir, exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"PerformanceLog_{timestamp}.txt"
-        filepath = os.path.join(log_dir, filename)
-        with open(filepath, "w") as f:
-            f.write(performance_string)
-        print(f"Performance log saved to: {filepath}")
+    def log_performance(performance_string, record=None, log_format="text"):
+        if log_format in ("jsonl", "both") and record is not None:
+            filepath = PERFORMANCE_LOG_STORE.append(record)
+            print(f"Performance record appended to: {filepath}")
+        if log_format in ("text", "both") or record is None:
+            log_dir = PERFORMANCE_LOG_DIR
+            os.makedirs(log_dir, exist_ok=True)
+            # Microseconds plus a short random suffix: runs finishing in the same second no longer collide
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            filename = f"PerformanceLog_{timestamp}_{uuid.uuid4().hex[:6]}.txt"
+            filepath = os.path.join(log_dir, filename)
+            with open(filepath, "w") as f:
+                f.write(performance_string)
+            print(f"Performance log saved to: {filepath}")
         print(performance_string)  # Console'a da yazdır
 
+class PerformanceMetricsResultNode:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "metrics_job_id": ("STRING", {"forceInput": True}),
+            },
+            "optional": {
+                # 0 waits until the job finishes
+                "timeout_seconds": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 3600.0, "step": 1.0}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("performance_metrics",)
+    FUNCTION = "fetch_metrics"
+    CATEGORY = "performance"
+
+    @classmethod
+    def IS_CHANGED(cls, metrics_job_id, timeout_seconds=0.0):
+        return float("nan")  # Job status changes outside the graph; never reuse a cached result
+
+    def fetch_metrics(self, metrics_job_id, timeout_seconds=0.0):
+        if not metrics_job_id:
+            return ("No asynchronous metrics job (End node ran in sync mode)",)
+        result = METRIC_JOBS.result(metrics_job_id, timeout=timeout_seconds or None)
+        if result is None:
+            return (f"Metrics job {metrics_job_id}: {METRIC_JOBS.status(metrics_job_id)}",)
+        return (result,)
+
+
 NODE_CLASS_MAPPINGS = {
     "PerformanceMeasurementStartNode": PerformanceMeasurementStartNode,
-    "PerformanceMeasurementEndNode": PerformanceMeasurementEndNode
+    "PerformanceMeasurementEndNode": PerformanceMeasurementEndNode,
+    "PerformanceCheckpointNode": PerformanceCheckpointNode,
+    "PerformanceMetricsResultNode": PerformanceMetricsResultNode
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "PerformanceMeasurementStartNode": "Start Performance Measurement",
-    "PerformanceMeasurementEndNode": "End Performance Measurement"
+    "PerformanceMeasurementEndNode": "End Performance Measurement",
+    "PerformanceCheckpointNode": "Performance Checkpoint",
+    "PerformanceMetricsResultNode": "Fetch Performance Metrics"
 }
\ No newline at end of file
@@ -0,0 +1,227 @@
+"""Headless, multi-process rescoring of sample_outputs-style directory trees.
+
+Every folder holding an original.* and generated.* image is scored with
+PerformanceMeasurement, without replaying the workflow. Folders are spread over a
+process pool; each worker loads the metric networks once, gets an equal share of the
+CPU threads and decodes the next pair on a background thread while the current one
+is scored. Results are written as one JSON record per folder.
+
+Scores are kept in a manifest keyed by the pair's content hash, the metric version
+(METRIC_VERSIONS) and the scoring configuration, so a re-run only scores new or
+changed pairs and metrics whose version was bumped.
+
+    python evaluate_sample_outputs.py --root /data/archive --output archive_scores.jsonl --workers 8
+    python evaluate_sample_outputs.py --metric-profile fast --workers 4
+    python evaluate_sample_outputs.py --root /data/archive --force   # ignore stored scores
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from evaluation_utils import SAMPLE_OUTPUTS_DIR, find_sample_pairs, import_performance_node, load_pair
+
+# Per-process state, filled by init_worker
+_WORKER = {}
+
+MANIFEST_FILENAME = "evaluation_manifest.json"
+
+
+class EvaluationManifest:
+    """Stored scores keyed by pair content hash, plus a stat cache of file hashes.
+
+    A file is only re-hashed when its size or mtime changes, so checking an unchanged
+    archive costs one stat() per image. Scores are stored per "metric@config" with the
+    metric version they were computed with.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.scores = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.scores = data.get("scores", {})
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        entry = self.files.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["hash"]
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        self.files[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": digest.hexdigest()}
+        return self.files[path]["hash"]
+
+    def pair_hash(self, original_path, generated_path):
+        return hashlib.blake2b(f"{self.file_hash(original_path)}|{self.file_hash(generated_path)}".encode(),
+                               digest_size=20).hexdigest()
+
+    def lookup(self, pair_hash, metric_names, versions, config):
+        # Returns (stored values still valid, metrics that need scoring)
+        stored = self.scores.get(pair_hash, {})
+        cached, missing = {}, []
+        for metric in metric_names:
+            entry = stored.get(f"{metric}@{config}")
+            if entry is not None and entry["version"] == versions[metric]:
+                cached[metric] = entry["value"]
+            else:
+                missing.append(metric)
+        return cached, tuple(missing)
+
+    def store(self, pair_hash, metrics, versions, config):
+        stored = self.scores.setdefault(pair_hash, {})
+        for metric, value in metrics.items():
+            stored[f"{metric}@{config}"] = {"version": versions[metric], "value": value}
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files, "scores": self.scores}, f)
+        os.replace(tmp_path, self.path)
+
+
+def init_worker(device, inference_backend, threads):
+    # Split the cores between workers so they do not oversubscribe each other. Threads are
+    # set after the import so nothing the node does on import can override them.
+    node_module = import_performance_node()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:  # Already set once parallel work has started
+        pass
+    _WORKER["perf_measure"] = node_module.PerformanceMeasurement(inference_backend=inference_backend, device=device)
+
+
+def score_chunk(chunk, metric_names, eval_resolution):
+    perf_measure = _WORKER["perf_measure"]
+    records = []
+    with ThreadPoolExecutor(max_workers=1) as decoder:
+        # Decoding runs one pair ahead of scoring
+        pending = decoder.submit(load_pair, *chunk[0][1:]) if chunk else None
+        for index, (name, original_path, generated_path) in enumerate(chunk):
+            record = {"name": name, "original": original_path, "generated": generated_path, "pid": os.getpid()}
+            try:
+                original, generated = pending.result()
+            except Exception as e:
+                original = generated = None
+                record["error"] = f"decode failed: {e}"
+            if index + 1 < len(chunk):
+                pending = decoder.submit(load_pair, *chunk[index + 1][1:])
+            if original is not None:
+                start = time.perf_counter()
+                try:
+                    metrics = perf_measure.calculate_batch_metrics(original, generated, metric_names, eval_resolution)
+                    record["metrics"] = {metric: values[0] for metric, values in metrics.items()}
+                except Exception as e:
+                    record["error"] = str(e)
+                record["height"], record["width"] = generated.shape[1:3]
+                record["scoring_time_s"] = time.perf_counter() - start
+            records.append(record)
+    return records
+
+
+def _score_job(job):
+    return score_chunk(*job)
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score original/generated pairs across a process pool.")
+    parser.add_argument("--root", default=SAMPLE_OUTPUTS_DIR, help="Directory tree to walk")
+    parser.add_argument("--output", default="sample_scores.jsonl", help="JSONL file, one record per folder")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--chunk-size", type=int, default=4, help="Folders handed to a worker at a time")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--inference-backend", default="fp32")
+    parser.add_argument("--metric-profile", default="full")
+    parser.add_argument("--eval-resolution", type=int, default=0)
+    parser.add_argument("--manifest", help=f"Score manifest (default: <root>/{MANIFEST_FILENAME})")
+    parser.add_argument("--no-manifest", action="store_true", help="Score everything and store nothing")
+    parser.add_argument("--force", action="store_true", help="Rescore everything and refresh the manifest")
+    args = parser.parse_args()
+
+    node_module = import_performance_node()
+    metric_names, eval_resolution = node_module.resolve_metric_profile(args.metric_profile, None, args.eval_resolution)
+    versions = node_module.METRIC_VERSIONS
+    config = f"{args.inference_backend}:{eval_resolution or 'full'}"
+    pairs = list(find_sample_pairs(args.root))
+    if not pairs:
+        raise SystemExit(f"No original/generated pairs found under {args.root}")
+
+    start = time.perf_counter()
+    manifest = EvaluationManifest(None if args.no_manifest else args.manifest or os.path.join(args.root, MANIFEST_FILENAME))
+    # Pairs grouped by the metrics they still need; fully cached pairs are reported without a worker
+    pending = defaultdict(list)
+    pair_hashes, cached = {}, {}
+    for pair in pairs:
+        name = pair[0]
+        pair_hashes[name] = manifest.pair_hash(*pair[1:])
+        if args.force:
+            cached[name], missing = {}, metric_names
+        else:
+            cached[name], missing = manifest.lookup(pair_hashes[name], metric_names, versions, config)
+        if missing:
+            pending[missing].append(pair)
+    to_score = sum(len(group) for group in pending.values())
+    print(f"{len(pairs)} pairs, {len(pairs) - to_score} fully cached, {to_score} to score ({', '.join(metric_names)})")
+
+    scored = failed = 0
+    with open(args.output, "w", encoding="utf-8") as output:
+        def write(record):
+            record["cached"] = sorted(cached[record["name"]])
+            record["metrics"] = {**cached[record["name"]], **record.get("metrics", {})}
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        pending_names = {pair[0] for group in pending.values() for pair in group}
+        for name, original_path, generated_path in pairs:
+            if name not in pending_names:
+                write({"name": name, "original": original_path, "generated": generated_path})
+
+        try:
+            if to_score:
+                workers = max(1, min(args.workers, to_score))
+                threads = max(1, (os.cpu_count() or 1) // workers)
+                print(f"Scoring with {workers} workers x {threads} threads")
+                jobs = [(chunk, missing, eval_resolution)
+                        for missing, group in pending.items() for chunk in chunked(group, args.chunk_size)]
+                # spawn: forked workers would inherit the parent's torch thread pools
+                context = multiprocessing.get_context("spawn")
+                with context.Pool(workers, initializer=init_worker,
+                                  initargs=(args.device, args.inference_backend, threads)) as pool:
+                    for records in pool.imap_unordered(_score_job, jobs):
+                        for record in records:
+                            if "metrics" in record:
+                                manifest.store(pair_hashes[record["name"]], record["metrics"], versions, config)
+                            write(record)
+                            failed += "error" in record
+                            scored += 1
+                        print(f"    {scored}/{to_score} scored", end="\r", flush=True)
+        finally:
+            # Partial progress is kept, so an interrupted run resumes where it stopped
+            manifest.save()
+
+    elapsed = time.perf_counter() - start
+    rate = f" ({scored / elapsed:.2f} pairs/s)" if scored else ""
+    print(f"\nScored {scored} pairs ({failed} failed) in {elapsed:.1f} s{rate}")
+    print(f"Results written to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Shared helpers for the standalone performance scripts in python_scripts/."""
+import os
+import sys
+
+import numpy as np
+import torch
+from PIL import Image
+
+CUSTOM_NODES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "custom_nodes")
+SAMPLE_OUTPUTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_outputs")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def import_performance_node():
+    # The node file is written for ComfyUI's custom_nodes loader, so import it by path.
+    # Scripts manage torch threads themselves, so the node's tuned CPU thread profile is not applied.
+    os.environ.setdefault("PERFORMANCE_CPU_THREAD_PROFILE", "off")
+    if CUSTOM_NODES_DIR not in sys.path:
+        sys.path.insert(0, CUSTOM_NODES_DIR)
+    import performance_evaluation_node
+    return performance_evaluation_node
+
+
+def load_image(path, size=None):
+    # ComfyUI IMAGE layout: (1, H, W, 3) float in [0, 1]
+    with Image.open(path) as img:
+        img = img.convert("RGB")
+        if size is not None and img.size != tuple(size):
+            img = img.resize(tuple(size), Image.NEAREST)  # Same as the workflow's nearest-exact upscale
+        array = np.asarray(img, dtype=np.float32) / 255.0
+    return torch.from_numpy(array).unsqueeze(0)
+
+
+def find_image(folder, stem):
+    for extension in IMAGE_EXTENSIONS:
+        path = os.path.join(folder, stem + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def find_sample_pairs(root=SAMPLE_OUTPUTS_DIR):
+    # Yields (name, original_path, generated_path) for every folder holding both images
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames.sort()
+        original = find_image(dirpath, "original")
+        generated = find_image(dirpath, "generated")
+        if original and generated:
+            yield os.path.relpath(dirpath, root), original, generated
+
+
+def load_pair(original_path, generated_path):
+    # The original is resized to the generated image, as the workflow does before scoring
+    generated = load_image(generated_path)
+    original = load_image(original_path, size=(generated.shape[2], generated.shape[1]))
+    return original, generated
@@ -0,0 +1,65 @@
+"""Export the metric feature extractors into the node's local weight store.
+
+Run once on a machine with internet access (or a populated torchvision cache), then
+copy the output directory to the air-gapped hosts. Only the parts the metrics use
+are stored: the VGG19 convolutional trunk and Inception v3 without its classifier
+and auxiliary head. The node memory-maps these files, so ComfyUI workers on one
+host share the weight pages.
+
+    python export_metric_weights.py
+    python export_metric_weights.py --output-dir /mnt/shared/metric_weights
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import torch
+from torchvision.models import Inception_V3_Weights, VGG19_Weights, inception_v3, vgg19
+
+from evaluation_utils import import_performance_node
+
+
+def save_state(state, path):
+    # Contiguous tensors in the default zipfile format, which torch.load(mmap=True) maps directly
+    torch.save({key: value.contiguous() for key, value in state.items()}, path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return {"bytes": os.path.getsize(path), "sha256": digest.hexdigest()}
+
+
+def main():
+    node_module = import_performance_node()
+    parser = argparse.ArgumentParser(description="Write truncated metric weights for offline, memory-mapped loading.")
+    parser.add_argument("--output-dir", default=node_module.METRIC_WEIGHTS_DIR)
+    args = parser.parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    manifest = {"torch": torch.__version__, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "files": {}}
+
+    vgg_state = vgg19(weights=VGG19_Weights.IMAGENET1K_V1).features.state_dict()
+    manifest["files"][node_module.VGG_WEIGHTS_FILE] = {
+        "source": "VGG19_Weights.IMAGENET1K_V1 (features only)",
+        **save_state(vgg_state, os.path.join(args.output_dir, node_module.VGG_WEIGHTS_FILE)),
+    }
+
+    inception_state = inception_v3(weights=Inception_V3_Weights.DEFAULT).state_dict()
+    inception_state = {key: value for key, value in inception_state.items()
+                       if not key.startswith(("fc.", "AuxLogits."))}
+    manifest["files"][node_module.INCEPTION_WEIGHTS_FILE] = {
+        "source": "Inception_V3_Weights.DEFAULT (without fc and AuxLogits)",
+        **save_state(inception_state, os.path.join(args.output_dir, node_module.INCEPTION_WEIGHTS_FILE)),
+    }
+
+    with open(os.path.join(args.output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    for name, entry in manifest["files"].items():
+        print(f"{name}: {entry['bytes'] / 1024**2:.1f} MB  sha256 {entry['sha256'][:16]}...")
+    print(f"Weights exported to: {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
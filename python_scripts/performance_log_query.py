@@ -0,0 +1,228 @@
+"""Query the structured performance log written by PerformanceMeasurementEndNode.
+
+Streams over the rotated performance-*.jsonl segments one record at a time; only the
+numeric fields being summarized are kept in memory.
+
+    python performance_log_query.py --since 2026-10-01 summary
+    python performance_log_query.py daily --fields execution_time_s metrics.ssim
+    python performance_log_query.py --where metric_profile=fast --min metrics.ssim=0.9 filter
+    python performance_log_query.py export --output performance.parquet
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+from array import array
+from collections import OrderedDict
+
+DEFAULT_LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "performance")
+DEFAULT_FIELDS = ("execution_time_s", "metric_overhead_s")
+
+
+def iter_records(log_dir):
+    for path in sorted(glob.glob(os.path.join(log_dir, "performance-*.jsonl"))):
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Skipping malformed line {path}:{line_number}", file=sys.stderr)
+
+
+def flatten(record, prefix=""):
+    # Nested dicts become dotted keys; per-item lists are left out
+    flat = {}
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif not isinstance(value, list):
+            flat[name] = value
+    return flat
+
+
+def parse_conditions(pairs):
+    conditions = []
+    for pair in pairs or ():
+        key, _, value = pair.partition("=")
+        if not value:
+            raise SystemExit(f"Expected key=value, got '{pair}'")
+        conditions.append((key, value))
+    return conditions
+
+
+def make_filter(args):
+    where = parse_conditions(args.where)
+    minimum = [(key, float(value)) for key, value in parse_conditions(args.min)]
+    maximum = [(key, float(value)) for key, value in parse_conditions(args.max)]
+
+    def matches(flat):
+        timestamp = flat.get("timestamp", "")
+        if args.since and timestamp[:10] < args.since:
+            return False
+        if args.until and timestamp[:10] > args.until:
+            return False
+        if any(str(flat.get(key)) != value for key, value in where):
+            return False
+        for key, bound in minimum:
+            if not isinstance(flat.get(key), (int, float)) or flat[key] < bound:
+                return False
+        for key, bound in maximum:
+            if not isinstance(flat.get(key), (int, float)) or flat[key] > bound:
+                return False
+        return True
+
+    return matches
+
+
+def filtered_records(args):
+    matches = make_filter(args)
+    for record in iter_records(args.log_dir):
+        flat = flatten(record)
+        if matches(flat):
+            yield record, flat
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return math.nan
+    position = (len(sorted_values) - 1) * fraction
+    lower, upper = math.floor(position), math.ceil(position)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def resolve_fields(args, flat):
+    # Default fields plus every metrics.* value present in the first matching record
+    if args.fields:
+        return list(args.fields)
+    return list(DEFAULT_FIELDS) + sorted(key for key in flat if key.startswith("metrics."))
+
+
+def command_summary(args):
+    fields, values = None, {}
+    count = 0
+    for _, flat in filtered_records(args):
+        if fields is None:
+            fields = resolve_fields(args, flat)
+            values = {field: array("d") for field in fields}
+        count += 1
+        for field in fields:
+            value = flat.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values[field].append(value)
+
+    print(f"Records: {count}")
+    if not count:
+        return
+    print(f"{'field':<32}{'n':>8}{'mean':>12}{'p50':>12}{'p90':>12}{'p95':>12}{'p99':>12}{'max':>12}")
+    for field in fields:
+        data = sorted(values[field])
+        if not data:
+            continue
+        mean = sum(data) / len(data)
+        print(f"{field:<32}{len(data):>8}{mean:>12.4f}{percentile(data, 0.5):>12.4f}{percentile(data, 0.9):>12.4f}"
+              f"{percentile(data, 0.95):>12.4f}{percentile(data, 0.99):>12.4f}{data[-1]:>12.4f}")
+
+
+def command_daily(args):
+    fields = None
+    days = OrderedDict()  # day -> {"count": n, field: [n, sum, min, max]}
+    for _, flat in filtered_records(args):
+        if fields is None:
+            fields = resolve_fields(args, flat)
+        day = flat.get("timestamp", "unknown")[:10]
+        stats = days.setdefault(day, {"count": 0})
+        stats["count"] += 1
+        for field in fields:
+            value = flat.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                n, total, low, high = stats.get(field, (0, 0.0, math.inf, -math.inf))
+                stats[field] = (n + 1, total + value, min(low, value), max(high, value))
+
+    for day in sorted(days):
+        stats = days[day]
+        print(f"{day}  runs: {stats['count']}")
+        for field in fields:
+            if field in stats:
+                n, total, low, high = stats[field]
+                print(f"    {field:<32} mean {total / n:>10.4f}  min {low:>10.4f}  max {high:>10.4f}")
+
+
+def command_filter(args):
+    shown = 0
+    for record, _ in filtered_records(args):
+        print(json.dumps(record, ensure_ascii=False))
+        shown += 1
+        if args.limit and shown >= args.limit:
+            break
+
+
+def command_export(args):
+    # Columnar export: Parquet when pyarrow is installed and requested, otherwise a compressed .npz
+    columns = OrderedDict()
+    rows = 0
+    for _, flat in filtered_records(args):
+        for key in flat:
+            if key not in columns:
+                columns[key] = [None] * rows
+        for key, column in columns.items():
+            column.append(flat.get(key))
+        rows += 1
+
+    if args.output.endswith(".parquet"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet export needs pyarrow; use an .npz output instead")
+        pq.write_table(pa.table(dict(columns)), args.output, compression="zstd")
+    else:
+        import numpy as np
+
+        arrays = {}
+        for key, column in columns.items():
+            if all(value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+                   for value in column):
+                arrays[key] = np.array([math.nan if value is None else value for value in column], dtype=np.float64)
+            else:
+                arrays[key] = np.array(["" if value is None else str(value) for value in column])
+        np.savez_compressed(args.output, **arrays)
+    print(f"Exported {rows} records, {len(columns)} columns to: {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the structured performance log.")
+    parser.add_argument("--log-dir", default=DEFAULT_LOG_DIR)
+    parser.add_argument("--since", help="First day to include (YYYY-MM-DD)")
+    parser.add_argument("--until", help="Last day to include (YYYY-MM-DD)")
+    parser.add_argument("--where", action="append", help="Exact match, e.g. metric_profile=fast (repeatable)")
+    parser.add_argument("--min", action="append", help="Numeric lower bound, e.g. metrics.ssim=0.9 (repeatable)")
+    parser.add_argument("--max", action="append", help="Numeric upper bound, e.g. execution_time_s=120 (repeatable)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    summary = subparsers.add_parser("summary", help="Percentiles of numeric fields")
+    summary.add_argument("--fields", nargs="*")
+    summary.set_defaults(handler=command_summary)
+
+    daily = subparsers.add_parser("daily", help="Per-day aggregates")
+    daily.add_argument("--fields", nargs="*")
+    daily.set_defaults(handler=command_daily)
+
+    filter_parser = subparsers.add_parser("filter", help="Print matching records as JSONL")
+    filter_parser.add_argument("--limit", type=int, default=0)
+    filter_parser.set_defaults(handler=command_filter)
+
+    export = subparsers.add_parser("export", help="Write matching records to a columnar file")
+    export.add_argument("--output", required=True, help="Target .parquet or .npz file")
+    export.set_defaults(handler=command_export)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
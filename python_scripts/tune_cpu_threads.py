@@ -0,0 +1,132 @@
+"""CPU thread auto-tuning for the metric engine.
+
+Micro-benchmarks every metric on this host at several intra-op / inter-op thread
+counts and SSIM band heights, then writes the fastest configuration to the profile
+that performance_evaluation_node.py applies when ComfyUI loads the nodes.
+
+    python tune_cpu_threads.py
+    python tune_cpu_threads.py --reserve-cores 4   # leave cores for ComfyUI's own work
+    python tune_cpu_threads.py --threads 4 8 16 --inter-op 1 2 --size 768 --dry-run
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import torch
+
+from benchmark_performance_measurement import synthetic_pair
+from evaluation_utils import import_performance_node
+
+METRIC_CALLS = {
+    "ms_ssim": lambda pm, a, b: pm.calculate_ms_ssim_batch(a, b),
+    "feature_similarity": lambda pm, a, b: pm.calculate_feature_similarity_batch(a, b),
+    "vgg_losses": lambda pm, a, b: pm.calculate_vgg_losses_batch(a, b),
+}
+
+
+def median_latency(fn, repeats):
+    fn()  # Warm-up
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return float(np.median(latencies))
+
+
+def measure_inter_op(inter_op, thread_counts, band_rows, size, batch_size, repeats):
+    # Runs in a fresh process: the inter-op pool can only be sized before torch first uses it
+    torch.set_num_interop_threads(inter_op)
+    node_module = import_performance_node()
+    perf_measure = node_module.PerformanceMeasurement(device="cpu")
+    image1, image2 = synthetic_pair(size, batch_size)
+    results = []
+    with torch.inference_mode():
+        for threads in thread_counts:
+            torch.set_num_threads(threads)
+            timings = {}
+            for rows in band_rows:
+                if rows:
+                    fn = lambda: perf_measure.calculate_ssim_batch_streaming(image1, image2, rows)
+                else:
+                    fn = lambda: perf_measure.calculate_ssim_batch(image1, image2)
+                timings[f"ssim@{rows or 'full'}"] = median_latency(fn, repeats)
+            for name, call in METRIC_CALLS.items():
+                timings[name] = median_latency(lambda: call(perf_measure, image1, image2), repeats)
+            results.append({"inter_op_threads": inter_op, "intra_op_threads": threads, "timings": timings})
+            print(f"    inter-op {inter_op:>2}  intra-op {threads:>3}: "
+                  + "  ".join(f"{name} {value:.3f}s" for name, value in timings.items()), flush=True)
+    return results
+
+
+def best_configuration(results):
+    # Total time of one full metric pass, with SSIM at its fastest band height for that thread setting
+    best = None
+    for result in results:
+        ssim = {key: value for key, value in result["timings"].items() if key.startswith("ssim@")}
+        ssim_key = min(ssim, key=ssim.get)
+        total = ssim[ssim_key] + sum(value for key, value in result["timings"].items() if not key.startswith("ssim@"))
+        if best is None or total < best["total_s"]:
+            rows = ssim_key.split("@")[1]
+            best = {"intra_op_threads": result["intra_op_threads"], "inter_op_threads": result["inter_op_threads"],
+                    "ssim_band_rows": None if rows == "full" else int(rows), "total_s": total}
+    return best
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Tune torch CPU threading for the performance metrics.")
+    parser.add_argument("--reserve-cores", type=int, default=0, help="Cores to leave for ComfyUI itself")
+    parser.add_argument("--threads", nargs="+", type=int, help="Intra-op thread counts to try")
+    parser.add_argument("--inter-op", nargs="+", type=int, default=[1, 2], help="Inter-op thread counts to try")
+    parser.add_argument("--band-rows", nargs="+", type=int, default=[0, 64, 128, 256],
+                        help="SSIM band heights to try (0 = whole image)")
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Profile path (default: the node's CPU_THREAD_PROFILE_PATH)")
+    parser.add_argument("--dry-run", action="store_true", help="Report the best setting without saving it")
+    args = parser.parse_args()
+
+    usable = max(1, cores - args.reserve_cores)
+    thread_counts = args.threads or sorted({2**i for i in range(usable.bit_length()) if 2**i <= usable} | {usable})
+    node_module = import_performance_node()
+    output = args.output or node_module.CPU_THREAD_PROFILE_PATH
+    print(f"Tuning on {cores} cores ({usable} usable): intra-op {thread_counts}, inter-op {args.inter_op}, "
+          f"SSIM band rows {args.band_rows}, {args.size}px x {args.batch_size}")
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for inter_op in args.inter_op:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results += executor.submit(measure_inter_op, inter_op, thread_counts, args.band_rows, args.size,
+                                       args.batch_size, args.repeats).result()
+
+    best = best_configuration(results)
+    print(f"\nBest: intra-op {best['intra_op_threads']}, inter-op {best['inter_op_threads']}, "
+          f"SSIM band rows {best['ssim_band_rows'] or 'full'} ({best['total_s']:.3f} s per metric pass)")
+    if args.dry_run:
+        return
+
+    profile = {
+        **best,
+        "host": node_module.cpu_host_fingerprint(),
+        "reserve_cores": args.reserve_cores,
+        "tuned_at": datetime.now().isoformat(timespec="seconds"),
+        "image_size": args.size,
+        "batch_size": args.batch_size,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(profile, f, indent=2)
+    print(f"Profile saved to: {output} (applied the next time the nodes load)")
+
+
+if __name__ == "__main__":
+    main()
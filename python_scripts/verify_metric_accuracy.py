@@ -0,0 +1,117 @@
+"""Accuracy checks for the torch metric implementations.
+
+Compares the node's SSIM (uniform and Gaussian windows, whole-image and streamed over
+row bands) with skimage.metrics.structural_similarity, the band-streamed MS-SSIM with
+the in-memory one, and, on the sample_outputs pairs, the tiled VGG losses with the
+untiled ones. Fails with a non-zero exit code when any difference exceeds the
+tolerance documented on the implementation.
+
+    python verify_metric_accuracy.py
+    python verify_metric_accuracy.py --device cuda --sizes 64 257 --no-samples
+"""
+import argparse
+import sys
+
+import numpy as np
+import torch
+from skimage.metrics import structural_similarity as skimage_ssim
+
+from benchmark_performance_measurement import synthetic_pair
+from evaluation_utils import SAMPLE_OUTPUTS_DIR, find_sample_pairs, import_performance_node, load_pair
+
+SSIM_TOLERANCE = {torch.float32: 1e-4, torch.float64: 1e-8}
+VGG_TILE_SIZES = (256, 512)
+SKIMAGE_OPTIONS = {
+    "uniform": {},
+    "gaussian": {"gaussian_weights": True, "sigma": 1.5, "use_sample_covariance": False},
+}
+
+
+def reference_ssim(image1, image2, window):
+    # Per-item skimage SSIM of (B, H, W, 3) arrays, always in float64
+    return np.array([skimage_ssim(a.astype(np.float64), b.astype(np.float64), channel_axis=-1, data_range=1.0,
+                                  **SKIMAGE_OPTIONS[window])
+                     for a, b in zip(image1, image2)])
+
+
+def ssim_checks(node_module, perf_measure, name, image1, image2):
+    # image1/image2 are (B, H, W, 3) tensors in [0, 1], the pixels skimage is given
+    arrays = image1.numpy(), image2.numpy()
+    x, y = (image.permute(0, 3, 1, 2).to(perf_measure.device) for image in (image1, image2))
+    checks = []
+    for window in SKIMAGE_OPTIONS:
+        expected = reference_ssim(*arrays, window)
+        for dtype, tolerance in SSIM_TOLERANCE.items():
+            values = node_module.structural_similarity(x.to(dtype), y.to(dtype), data_range=1.0, window=window)
+            checks.append((f"{name} ssim[{window}] {str(dtype).split('.')[-1]}",
+                           np.abs(values.double().cpu().numpy() - expected).max(), tolerance))
+        for band_rows in (1, 16, 128):
+            # preprocess_image divides by 255, so 0-255 inputs stream the same [0, 1] pixels
+            values = perf_measure.calculate_ssim_batch_streaming(image1 * 255, image2 * 255, band_rows, window=window)
+            checks.append((f"{name} ssim_streaming[{window}] band={band_rows}",
+                           np.abs(values.double().numpy() - expected).max(), SSIM_TOLERANCE[torch.float32]))
+    return checks
+
+
+def ms_ssim_checks(perf_measure, name, image1, image2):
+    image1, image2 = image1 * 255, image2 * 255  # See ssim_checks
+    expected = perf_measure.calculate_ms_ssim_batch(image1, image2).double().numpy()
+    checks = []
+    for band_rows in (16, 128):
+        values = perf_measure.calculate_ms_ssim_batch_streaming(image1, image2, band_rows)
+        checks.append((f"{name} ms_ssim_streaming band={band_rows}",
+                       np.abs(values.double().numpy() - expected).max(), SSIM_TOLERANCE[torch.float32]))
+    return checks
+
+
+def vgg_tiling_checks(node_module, perf_measure, name, image1, image2):
+    # Relative error of every tiled loss against the untiled one
+    expected = perf_measure.calculate_vgg_losses_batch(image1, image2)
+    checks = []
+    for tile_size in VGG_TILE_SIZES:
+        if max(image1.shape[1:3]) <= tile_size:
+            continue
+        tiled = perf_measure.calculate_vgg_losses_tiled(image1, image2, tile_size=tile_size)
+        for loss, value in tiled.items():
+            reference = expected[loss].double().numpy()
+            error = np.abs(value.double().numpy() - reference) / np.maximum(np.abs(reference), 1e-12)
+            checks.append((f"{name} {loss} tile={tile_size} (relative)", error.max(), node_module.VGG_TILED_RTOL))
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the torch metrics against their reference implementations.")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[16, 64, 257])
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--samples-dir", default=SAMPLE_OUTPUTS_DIR)
+    parser.add_argument("--no-samples", action="store_true", help="Only check the synthetic images")
+    args = parser.parse_args()
+
+    node_module = import_performance_node()
+    perf_measure = node_module.PerformanceMeasurement(device=args.device)
+
+    # (name, reference, generated, natural image); the tiling bound is stated for natural images only
+    cases = [(f"synthetic {size}px", *synthetic_pair(size, args.batch_size, seed=size), False) for size in args.sizes]
+    if not args.no_samples:
+        cases += [(name, *load_pair(original, generated), True)
+                  for name, original, generated in find_sample_pairs(args.samples_dir)]
+
+    failures = 0
+    with torch.inference_mode():
+        for name, image1, image2, natural in cases:
+            checks = ssim_checks(node_module, perf_measure, name, image1, image2)
+            checks += ms_ssim_checks(perf_measure, name, image1, image2)
+            if natural:
+                checks += vgg_tiling_checks(node_module, perf_measure, name, image1, image2)
+            for check, difference, tolerance in checks:
+                ok = difference <= tolerance
+                failures += not ok
+                print(f"{'ok  ' if ok else 'FAIL'}  {check:<60} max |d| {difference:.2e}  (tolerance {tolerance:.0e})")
+
+    print(f"\n{failures} check(s) failed" if failures else "\nAll checks passed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()